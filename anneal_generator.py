@@ -0,0 +1,259 @@
+import math
+import time
+
+import basic_ops
+import placement_mask
+from grid_generator import GridGenerator
+from word_graph import WordGraph
+
+
+class AnnealingGenerator(GridGenerator):
+    """ Fills a grid like GridGenerator, then keeps improving it by simulated annealing.
+
+    Once the greedy fill stalls, the rest of the time goes to random moves,
+    each of which changes a single word of the grid:
+     -> "add": a new word is added, as in the greedy fill;
+     -> "remove": a word is taken out of the grid;
+     -> "replace": a word is swapped for another one that fits the same cells;
+     -> "shift": a word is moved one cell forwards or backwards;
+     -> "relocate": a word is moved to any other place where it fits and
+     crosses a letter, all of which are found at once (only if NumPy is
+     installed, see placement_mask).
+
+    The score of a grid is the number of filled cells, and the change a move
+    makes to it is worked out from the cells of the word it moves alone (see
+    Grid.uses), so no move ever rescans the grid. Moves that fill the grid
+    more are always kept, and moves that empty it are kept with a
+    probability that shrinks as the temperature cools down, from
+    start_temperature to end_temperature over cooling_moves moves, after
+    which it heats up again for another round. This lets the search give up
+    a few cells now and then, to get out of grids that no word can be added
+    to. The annealing stalls, and stops, once a whole round goes by without
+    a fuller grid. The schedule (like every search for a word to add) is
+    counted in moves and draws rather than seconds, so that a seeded search
+    makes the same moves however loaded the machine is.
+
+    The fullest grid found along the way is the one that is kept.
+    """
+    # Temperatures at the start and end of the annealing, in cells
+    start_temperature = 2.0
+    end_temperature = 0.05
+
+    # Number of moves it takes to cool down from the start temperature to the end one
+    cooling_moves = 300
+
+    # Most words drawn when looking for a word to add
+    add_tries = 200
+
+    # How often each move is tried
+    move_weights = {"add": 4, "remove": 1, "replace": 2, "shift": 2, "relocate": 2}
+
+    def generate_grid(self, resume=False):
+        """ Updates the internal grid with content.
+
+        The greedy fill runs first, for as long as it keeps finding words,
+        and the annealing gets the rest of the time, which is timeout seconds
+        per loop in all (see GridGenerator.generate_grid).
+        """
+        if resume:
+            self.stop_requested = False
+            self.start_time = time.monotonic()
+        else:
+            self.reset()
+        self.emit("start", dimensions=self.dimensions, words=len(self.word_list), seed=self.seed)
+        deadline = time.monotonic() + self.timeout*self.n_loops
+
+        self.emit("loop", loop=1)
+        self.generate_content_for_grid(deadline - time.monotonic())
+        self.anneal(deadline)
+        self.cull_isolated_words()
+
+        self.emit("done")
+
+    def anneal(self, deadline):
+        """ Improves the grid with random moves until the deadline (or until a
+        whole round of cooling finds no fuller grid), and keeps the fullest grid found.
+        """
+        n_moves = 0
+        template_keys = {WordGraph.key(word) for word in self.template_words}
+        moves = [move for move, weight in self.move_weights.items() if move != "relocate" or placement_mask.is_available() for _ in range(weight)]
+
+        best_filled = self.grid.filled
+        best_words = list(self.words_in_grid)
+        best_move = 0
+
+        while self.grid.occupancy() < self.target_occupancy and not self.should_stop():
+            now = time.monotonic()
+            if now >= deadline or n_moves - best_move > self.cooling_moves:
+                break
+
+            # Cool down geometrically, from the start temperature to the end one
+            cooling = (n_moves % self.cooling_moves) / self.cooling_moves
+            temperature = self.start_temperature * (self.end_temperature/self.start_temperature)**cooling
+            n_moves += 1
+
+            if self.profile is not None:
+                self.profile.start()
+            move = self.rng.choice(moves)
+            if move == "add":
+                self.add_move(deadline - now)
+            else:
+                movable = [word for word in self.words_in_grid if WordGraph.key(word) not in template_keys]
+                if movable:
+                    word = self.rng.choice(movable)
+                    if move == "remove":
+                        self.remove_move(word, temperature)
+                    elif move == "replace":
+                        self.replace_move(word)
+                    elif move == "shift":
+                        self.shift_move(word, temperature)
+                    else:
+                        self.relocate_move(word, temperature)
+            if self.profile is not None:
+                self.profile.lap(move)
+
+            if self.grid.filled > best_filled:
+                best_filled = self.grid.filled
+                best_words = list(self.words_in_grid)
+                best_move = n_moves
+                self.stats["occupancy_curve"].append([time.monotonic(), self.grid.occupancy()])
+                self.emit("best")
+
+        # Go back to the fullest grid we found, as it was when we found it
+        if self.words_in_grid != best_words:
+            self.clear_grid()
+            self.word_list.restore()
+            for word in best_words:
+                self.place_existing_word(word)
+                if word["word"] in self.word_list:
+                    self.word_list.remove(word["word"])
+
+    def accept(self, delta, temperature):
+        """ Decides whether to keep a move that changes the number of filled cells by delta.
+        """
+        return delta >= 0 or self.rng.random() < math.exp(delta / temperature)
+
+    def can_take_out(self, word):
+        """ Checks whether a word can be taken out of the grid without leaving
+        letters that no word covers side by side, in the word's direction.
+        """
+        kept = [self.grid.uses[cell] > 1 for cell in self.grid.word_cells(word)]
+        return not any(kept[k] and kept[k+1] for k in range(len(kept)-1))
+
+    def cells_freed(self, word):
+        """ Returns how many cells taking a word out of the grid would empty.
+        """
+        return sum(1 for cell in self.grid.word_cells(word) if self.grid.uses[cell] == 1)
+
+    def cells_filled(self, word):
+        """ Returns how many cells putting a word in the grid would fill.
+        """
+        return sum(1 for cell in self.grid.word_cells(word) if self.grid.cells[cell] == 0)
+
+    def take_out(self, word):
+        self.grid.remove_word(word)
+        self.word_graph.remove(word)
+        self.words_in_grid.remove(word)
+        self.word_list.add(word["word"])
+
+    def put_in(self, word, new_words=()):
+        for possibility in [word] + list(new_words):
+            self.place_existing_word(possibility)
+            self.word_list.remove(possibility["word"])
+
+    def find_new_words(self, possibility):
+        """ Returns the new words that putting a word in the grid would create,
+        or None if it cannot go there.
+        """
+        if basic_ops.find_invalidity(possibility, self.grid) is not None:
+            return None
+        line, column = possibility["location"]
+        return basic_ops.find_new_words(possibility["word"], line, column, possibility["D"], self.grid, self.word_list)
+
+    def add_move(self, timeout):
+        """ Adds the best word found in a short search, if any.
+        """
+        candidates, scores, new_words = basic_ops.generate_valid_candidates(self.grid, self.word_list, self.dimensions, timeout, self.word_index, self.stats,
+                                                                            self.rng, self.top_k, self.profile, self.word_sampler, self.add_tries)
+        if not candidates:
+            return
+
+        new, score, new_words = basic_ops.select_candidate(candidates, scores, new_words)
+        self.put_in(new, new_words)
+        self.emit("word", word=new, new_words=new_words, score=score)
+
+    def remove_move(self, word, temperature):
+        if not self.can_take_out(word) or not self.accept(-self.cells_freed(word), temperature):
+            return
+        self.take_out(word)
+        self.emit("cull", word=word)
+
+    def replace_move(self, word):
+        """ Swaps a word for another one that fits the same cells, which fills
+        the grid just as much, but leaves other letters for later words to cross.
+        """
+        if not self.can_take_out(word):
+            return
+        self.take_out(word)
+
+        line, column = word["location"]
+        pattern = basic_ops.get_slot_pattern(line, column, word["D"], len(word["word"]), self.grid)
+        matches = self.word_index.find_matches(pattern, self.word_list)
+        self.rng.shuffle(matches)
+
+        for match in matches[:10]:
+            if match == word["word"]:
+                continue
+            new = {"word": match, "location": [line, column], "D": word["D"]}
+            new_words = self.find_new_words(new)
+            if new_words is not None:
+                self.put_in(new, new_words)
+                return
+
+        self.put_in(word)
+
+    def shift_move(self, word, temperature):
+        """ Moves a word one cell forwards or backwards, in its own direction.
+        """
+        if not self.can_take_out(word):
+            return
+        freed = self.cells_freed(word)
+        self.take_out(word)
+
+        offset = self.rng.choice((-1, 1))
+        line, column = word["location"]
+        if word["D"] == "E":
+            column += offset
+        else:
+            line += offset
+        new = {"word": word["word"], "location": [line, column], "D": word["D"]}
+
+        new_words = self.find_new_words(new)
+        if new_words is not None and self.accept(self.cells_filled(new) - freed, temperature):
+            self.put_in(new, new_words)
+        else:
+            self.put_in(word)
+
+    def relocate_move(self, word, temperature, max_tries=10):
+        """ Moves a word to another place where it fits and crosses a letter,
+        drawn from every such place in the grid (see placement_mask).
+        """
+        if not self.can_take_out(word):
+            return
+        freed = self.cells_freed(word)
+        self.take_out(word)
+
+        placements = placement_mask.find_placements(self.grid, word["word"], crossing=True)
+        self.rng.shuffle(placements)
+        for new in placements[:max_tries]:
+            if new["location"] == word["location"] and new["D"] == word["D"]:
+                continue
+            new_words = self.find_new_words(new)
+            if new_words is None:
+                continue
+            if self.accept(self.cells_filled(new) - freed, temperature):
+                self.put_in(new, new_words)
+                return
+            break
+
+        self.put_in(word)
@@ -1,18 +1,221 @@
+import hashlib
+import heapq
 import random
 import time
 
+from grid import BLOCK, BLOCK_CODE, Grid
 
-def generate_random_possibility(words, dim):
-    """ This function returns a randomly-generated possibility, instead of generating all
-    possible ones.
+
+# A fill stalls when no word is found in this many times the draws the recent words took...
+STALL_FACTOR = 10
+# ...or in this many draws, whichever is more
+MIN_STALL_TRIES = 1000
+
+
+def derive_seed(seed, stream):
+    """ Derives the seed of an independent random stream from a base seed.
+
+    Each stream number gives a seed that is unrelated to the others, so
+    generators seeded this way do not share random sequences.
+    """
+    digest = hashlib.sha256("{}:{}".format(seed, stream).encode()).digest()
+    return int.from_bytes(digest[:8], "big")
+
+
+def find_template_words(rows):
+    """ Lists the words already written in a template (see Grid.add_template),
+    i.e. every across or down run of at least two letters that is bounded by
+    blocked cells or the edges of the grid, as possibilities.
+
+    Runs next to an empty cell are only fragments, which words placed later
+    can grow, so they are left out.
+    """
+    words = []
+
+    for direction, lines in (("E", rows), ("S", ["".join(column) for column in zip(*rows)])):
+        for i, line in enumerate(lines):
+            for start, run in find_runs(line):
+                if len(run) < 2:
+                    continue
+                end = start + len(run)
+                if (start > 0 and line[start-1] != BLOCK) or (end < len(line) and line[end] != BLOCK):
+                    continue
+                location = [i, start] if direction == "E" else [start, i]
+                words.append({"word": run, "location": location, "D": direction})
+
+    return words
+
+
+def find_runs(line):
+    """ Splits a line of a template into its runs of letters, as (start, run) tuples.
+    """
+    runs = []
+    start = 0
+    for run in line.replace(BLOCK, ".").split("."):
+        if run:
+            runs.append((start, run))
+        start += len(run) + 1
+    return runs
+
+
+def find_open_slots(grid):
+    """ Lists the slots of the grid where a new word could be placed.
+
+    Each slot is a tuple (line, column, direction, min_length, max_length):
+    a word placed at that cell in that direction must be at least min_length
+    letters long, so that it crosses a letter already in the grid, and at most
+    max_length letters long, so that it fits in the grid (before the next
+    blocked cell). Slots that would not cross any letter are only listed if
+    the grid has no letters yet.
+
+    The slots of each line and column are kept in the grid, and only found
+    again once that line or column changes (see Grid.line_version), so a new
+    word only costs the lines and columns it touches.
+    """
+    empty = grid.filled == 0
+    slots = []
+
+    for line in range(grid.height):
+        # Lines without letters have no slots, unless the grid is empty
+        if not empty and grid.line_filled[line] == 0:
+            continue
+        cached = grid.line_slots[line]
+        if cached is None or cached[0] != grid.line_version[line] or cached[1] != empty:
+            cached = grid.line_slots[line] = (grid.line_version[line], empty, find_line_slots(grid, line, "E", empty))
+        slots += cached[2]
+
+    for column in range(grid.width):
+        if not empty and grid.column_filled[column] == 0:
+            continue
+        cached = grid.column_slots[column]
+        if cached is None or cached[0] != grid.column_version[column] or cached[1] != empty:
+            cached = grid.column_slots[column] = (grid.column_version[column], empty, find_line_slots(grid, column, "S", empty))
+        slots += cached[2]
+
+    return slots
+
+
+def find_line_slots(grid, number, direction, empty):
+    """ Lists the open slots (see find_open_slots) of a single line, if the
+    direction is "E", or of a single column, if it is "S".
+    """
+    slots = []
+
+    # Read the whole line at once
+    if direction == "E":
+        cells = grid.cells[number*grid.width:(number+1)*grid.width]
+    else:
+        cells = grid.cells[number::grid.width]
+
+    # Walk the line backwards, so we always know where the next letter (and block) is
+    next_letter = None
+    end = len(cells)
+    for k in range(len(cells)-1, -1, -1):
+        if cells[k] == BLOCK_CODE:
+            next_letter = None
+            end = k
+            continue
+        if cells[k]:
+            next_letter = k
+        if k > 0 and cells[k-1] and cells[k-1] != BLOCK_CODE:
+            continue
+        location = (number, k) if direction == "E" else (k, number)
+        if next_letter is not None:
+            slots.append(location + (direction, next_letter - k + 1, end - k))
+        elif empty:
+            slots.append(location + (direction, 1, end - k))
+
+    return slots
+
+
+def get_slot_pattern(line, column, direction, length, grid):
+    """ Returns the letters already in the grid along the given slot.
+
+    The pattern has one element per cell, which is None if the cell is empty.
+    """
+    if direction == "E":
+        cells = [grid.get(line, column+k) for k in range(length)]
+    else:
+        cells = [grid.get(line+k, column) for k in range(length)]
+
+    return [None if cell == 0 else cell for cell in cells]
+
+
+def get_slot_lengths(index, slot, grid):
+    """ Returns the lengths of the words in the index that can go in the given open slot.
+
+    Only lengths whose succeeding cell is free are kept.
     """
-    # Generate possibility
-    possibility = {"word": words[random.randint(0, len(words)-1)],
-                   "location": [random.randint(0, dim[0]-1), random.randint(0, dim[1]-1)],
-                   "D": "S" if random.random() > 0.5 else "E"}
+    line, column, direction, min_length, max_length = slot
+    lengths = []
+
+    for length in index.lengths:
+        if length < min_length or length > max_length:
+            continue
+        if direction == "E" and not is_cell_free(line, column+length, grid):
+            continue
+        if direction == "S" and not is_cell_free(line+length, column, grid):
+            continue
+        lengths.append(length)
+
+    return lengths
+
+
+def rank_open_slots(index, slots, grid, rng=random):
+    """ Ranks the open slots of the grid, and the word lengths they can take, from most to least constrained.
+
+    Slots are ranked by the shortest list of words the index has for any of
+    their letters, which is an upper bound on the number of words that fit
+    them, with ties broken at random. Slots that no word fits are left out.
+
+    Returns a list of (line, column, direction, pattern) tuples.
+    """
+    ranked = []
+    for slot in slots:
+        line, column, direction, min_length, max_length = slot
+        full_pattern = get_slot_pattern(line, column, direction, max_length, grid)
+
+        for length in get_slot_lengths(index, slot, grid):
+            pattern = full_pattern[:length]
+            bound = min((len(index.by_letter.get((length, position, letter), ())) for position, letter in enumerate(pattern) if letter is not None),
+                        default=len(index.by_length[length]))
+            if bound > 0:
+                ranked.append((bound, rng.random(), line, column, direction, pattern))
+
+    ranked.sort()
+    return [x[2:] for x in ranked]
+
 
-    # Return it
-    return possibility
+def generate_indexed_possibility(index, slots, grid, words, rng=random, sampler=None):
+    """ Picks a random open slot and asks the index for a word that fits it.
+
+    If a sampler is given (see word_sampler.WordSampler), words that are easy
+    to cross are favoured. Otherwise, every fitting word is just as likely.
+
+    Returns None if no available word fits the chosen slot.
+    """
+    slot = slots[rng.randint(0, len(slots)-1)]
+    line, column, direction = slot[:3]
+
+    lengths = get_slot_lengths(index, slot, grid)
+    if not lengths:
+        return None
+    length = lengths[rng.randint(0, len(lengths)-1)]
+
+    # Ask the index for words that match the letters in the slot
+    pattern = get_slot_pattern(line, column, direction, length, grid)
+    if sampler is not None:
+        word = sampler.random_match(pattern, rng)
+    elif all(letter is None for letter in pattern):
+        word = index.random_word(length, words, rng)
+    else:
+        matches = index.find_matches(pattern, words)
+        word = matches[rng.randint(0, len(matches)-1)] if matches else None
+
+    if word is None:
+        return None
+
+    return {"word": word, "location": [line, column], "D": direction}
 
 
 def is_within_bounds(word_len, line, column, direction, grid_width, grid_height):
@@ -27,11 +230,11 @@ def collides_with_existing_words(word, line, column, direction, grid):
     for k, letter in enumerate(list(word)):
         if direction == "E":
             # Collisions
-            if grid[line][column+k] != 0 and grid[line][column+k] != letter:
+            if grid.get(line, column+k) not in (0, letter):
                 return True
         if direction == "S":
             # Collisions
-            if grid[line+k][column] != 0 and grid[line+k][column] != letter:
+            if grid.get(line+k, column) not in (0, letter):
                 return True
 
     return False
@@ -65,65 +268,39 @@ def find_new_words(word, line, column, direction, grid, words):
     """
     new_words = []
 
-    for k, letter in enumerate(list(word)):
+    for k, letter in enumerate(word):
         if direction == "E":
             # If the space was originally blank and there are adjacent letters
-            if grid[line][column+k] == 0 and (line > 0 and grid[line-1][column+k] != 0 or line < len(grid)-1 and grid[line+1][column+k]):
+            if grid.get(line, column+k) == 0 and (not grid.is_free(line-1, column+k) or not grid.is_free(line+1, column+k)):
                 # Then we have to extract this new word
-                poss_word = [letter]
-                l = 1
-                while line+l < len(grid[0]) and grid[line+l][column+k] != 0:
-                    poss_word.append(grid[line+l][column+k])
-                    l+=1
-                l = 1
-                while line-l > 0 and grid[line-l][column+k] != 0:
-                    poss_word.insert(0, grid[line-l][column+k])
-                    l+=1
-                poss_word = ''.join(poss_word)
-
-                # And check if it exists in the list
-                if poss_word not in words:
+                start, before, after = grid.fragment_around(line, column+k, "S")
+                poss_word = before + letter + after
+
+                # And check if it is still available, and not used twice by this placement
+                if poss_word not in words or poss_word == word or any(x["word"] == poss_word for x in new_words):
                     return None
 
-                new_words.append({"D": "S", "word":poss_word, "location": [line-l+1, column+k]})
+                new_words.append({"D": "S", "word": poss_word, "location": [start, column+k]})
 
         if direction == "S":
-            # If the space was originally blank and there are adjacent letter
-            if grid[line+k][column] == 0 and (column > 0 and grid[line+k][column-1] != 0 or column < len(grid[0])-1 and grid[line+k][column+1]):
+            # If the space was originally blank and there are adjacent letters
+            if grid.get(line+k, column) == 0 and (not grid.is_free(line+k, column-1) or not grid.is_free(line+k, column+1)):
                 # Then we have to extract this new word
-                poss_word  = [letter]
-                l = 1
-                while column+l < len(grid) and grid[line+k][column+l] != 0:
-                    poss_word.append(grid[line+k][column+l])
-                    l+=1
-                l = 1
-                while column-l > 0 and grid[line+k][column-l] != 0:
-                    poss_word.insert(0, grid[line+k][column-l])
-                    l+=1
-                poss_word = ''.join(poss_word)
-
-                # And check if it exists in the list
-                if poss_word not in words:
+                start, before, after = grid.fragment_around(line+k, column, "E")
+                poss_word = before + letter + after
+
+                # And check if it is still available, and not used twice by this placement
+                if poss_word not in words or poss_word == word or any(x["word"] == poss_word for x in new_words):
                     return None
 
-                new_words.append({"D": "E", "word":poss_word, "location": [line+k,column-l+1]})
+                new_words.append({"D": "E", "word": poss_word, "location": [line+k, start]})
 
     return new_words
 
 
-def is_valid(possibility, grid, words):
-    """ This function determines whether a possibility is still valid in the
-    given grid. (see generate_grid)
-
-    A possibility is deemed invalid if:
-     -> it extends out of bounds
-     -> it collides with any word that already exists, i.e. if any of its
-     elements does not match the words already in the grid;
-     -> if the cell that precedes and follows it in its direction is not empty.
-
-    The function also analyses how the word interacts with previous adjacent
-    words, and invalidates the possibility of returns a list with the new
-    words, if applicable.
+def find_invalidity(possibility, grid):
+    """ Returns why a possibility cannot go in the grid: "bounds", "collision"
+    or "ends" (see is_valid), or None if it can.
     """
     # Import possibility to local vars, for clarity
     i = possibility["location"][0]
@@ -132,56 +309,63 @@ def is_valid(possibility, grid, words):
     D = possibility["D"]
 
     # Boundaries
-    if not is_within_bounds(len(word), i, j, D, len(grid[0]), len(grid)):
-        return False
+    if not is_within_bounds(len(word), i, j, D, grid.width, grid.height):
+        return "bounds"
 
     # Collisions
     if collides_with_existing_words(word, i, j, D, grid):
-        return False
+        return "collision"
 
     # Start and End
     if not ends_are_isolated(word, i, j, D, grid):
-        return False
+        return "ends"
+
+    return None
+
+
+def is_valid(possibility, grid, words):
+    """ This function determines whether a possibility is still valid in the
+    given grid. (see generate_grid)
 
+    A possibility is deemed invalid if:
+     -> it extends out of bounds
+     -> it collides with any word that already exists, i.e. if any of its
+     elements does not match the words already in the grid;
+     -> if the cell that precedes and follows it in its direction is not empty.
+
+    The function also analyses how the word interacts with previous adjacent
+    words, and invalidates the possibility of returns a list with the new
+    words, if applicable.
+    """
     # If we can't find any issues, it must be okay!
-    return True
+    return find_invalidity(possibility, grid) is None
 
 
 def score_candidate(candidate_word, new_words):
     return len(candidate_word) + 10*len(new_words)
 
 
-def add_word_to_grid(possibility, grid):
+def add_word_to_grid(possibility, grid, new_words=()):
     """ Adds a possibility to the given grid, which is modified in-place.
     (see generate_grid)
-    """
-    # Import possibility to local vars, for clarity
-    i = possibility["location"][0]
-    j = possibility["location"][1]
-    word = possibility["word"]
 
-    # Word is left-to-right
-    if possibility["D"] == "E":
-        grid[i][j:len(list(word))+j] = list(word)
-
-    # Word is top-to-bottom
-    # (I can't seem to be able to use the slicing as above)
-    if possibility["D"] == "S":
-        for index, a in enumerate(list(word)):
-            grid[i+index][j] = a
+    Any new words the possibility creates are recorded along with it, so that
+    the placement can be undone as a whole (see Grid.undo).
+    """
+    grid.place(possibility, new_words)
 
 
-def select_candidate(candidates, scores):
-    """ Select the candidate with the maximum score
+def select_candidate(candidates, scores, new_words):
+    """ Select the candidate with the maximum score, along with the new words it creates
     """
     max_score = max(scores)
     idx = scores.index(max_score)
 
-    return candidates[idx], scores[idx]
+    return candidates[idx], scores[idx], new_words[idx]
 
 
 def compute_occupancy(grid):
-    return 1 - (sum(x.count(0) for x in grid) / (len(grid[0])*len(grid)))
+    return grid.occupancy()
 
 
 def create_empty_grid(dimensions):
@@ -190,61 +374,174 @@ def create_empty_grid(dimensions):
     dimensions[0] -> lines
     dimensions[1] -> columns
     """
-    return [x[:] for x in [[0]*dimensions[1]]*dimensions[0]]
+    return Grid(dimensions)
+
+
+def generate_valid_candidates(grid, words, dim, timeout, index, stats=None, rng=random, top_k=None, profile=None, sampler=None, max_tries=None):
+    """ Searches for a valid candidate to add to the grid.
+
+    Candidates are drawn from the open slots of the grid, using the word
+    index to find only words that fit the letters already there.
+
+    If top_k is given (and the grid is not empty), every word that fits
+    the most constrained slot is evaluated instead (see
+    generate_top_candidates), and the best top_k candidates are returned.
+
+    Returns the list of candidates, their scores, and the list of new words
+    each of them creates. The search gives up after timeout seconds, or
+    after max_tries candidates, if that is given.
+
+    If a stats dictionary is given, the number of tries is added to its "tries" entry.
 
+    If a profiler is given, it times each stage of the search, and counts why
+    candidates are rejected (see profiler.Profiler).
+
+    If a sampler is given, indexed candidates favour words that are easy to
+    cross (see generate_indexed_possibility).
+    """
+    if top_k is not None and grid.filled > 0:
+        return generate_top_candidates(grid, words, index, top_k, timeout, stats, rng, profile, max_tries)
 
-def generate_valid_candidates(grid, words, dim, timeout):
     # Generate new candidates
     candidates = []
     scores = []
     new_words = []
     tries = 0
 
-    start_time = time.time()
+    start_time = time.monotonic()
+    if profile is not None:
+        profile.start()
+
+    # The open slots do not change until a word is added
+    slots = find_open_slots(grid)
+    if profile is not None:
+        profile.lap("open_slots")
+    if not slots:
+        return candidates, scores, new_words
 
     # Generate a new candidate
-    while not candidates and time.time() < start_time + timeout:
+    while not candidates and time.monotonic() < start_time + timeout and (max_tries is None or tries < max_tries):
         # Increment search "time"
         tries += 1
 
         # Get new possibility
-        new = generate_random_possibility(words, dim)
+        new = generate_indexed_possibility(index, slots, grid, words, rng, sampler)
+        if profile is not None:
+            profile.lap("draw")
+        if new is None:
+            if profile is not None:
+                profile.count("rejected_no_fit")
+            continue
 
         # Evaluate validity
-        if not is_valid(new, grid, words):
+        invalidity = find_invalidity(new, grid)
+        if profile is not None:
+            profile.lap("validity")
+        if invalidity is not None:
+            if profile is not None:
+                profile.count("rejected_" + invalidity)
             continue
 
         # Find new words that this possibility generates
-        new_words = find_new_words(new["word"], new["location"][0], new["location"][1], new["D"], grid, words)
-
-        # If new_words is None, then the possibility is invalid
-        if new_words == None:
-            new_words = []
+        created_words = find_new_words(new["word"], new["location"][0], new["location"][1], new["D"], grid, words)
+        if profile is not None:
+            profile.lap("new_words")
+
+        # If created_words is None, then the possibility is invalid
+        if created_words == None:
+            if profile is not None:
+                profile.count("rejected_crossing")
             continue
 
         # Calculate this possibility's score
-        score = score_candidate(new["word"], new_words)
+        score = score_candidate(new["word"], created_words)
 
         # Add to list of candidates
         candidates.append(new)
         scores.append(score)
+        new_words.append(created_words)
+
+    if stats is not None:
+        stats["tries"] += tries
 
     return candidates, scores, new_words
 
 
+def generate_top_candidates(grid, words, index, top_k, timeout, stats=None, rng=random, profile=None, max_tries=None):
+    """ Evaluates every word that fits the most constrained open slot, and keeps the best top_k.
+
+    The most constrained slot is the one the fewest words fit (see
+    rank_open_slots). Its words are evaluated in random order until they run
+    out, the timeout expires or max_tries of them (if given) were evaluated, and only the top_k best scoring candidates
+    are kept along the way, in a bounded heap. If none of them can be placed,
+    the next most constrained slot is tried, and so on.
+
+    Returns the kept candidates, best first, along with their scores and the
+    new words each of them creates.
+    """
+    start_time = time.monotonic()
+    heap = []
+    tries = 0
+    if profile is not None:
+        profile.start()
+
+    ranked_slots = rank_open_slots(index, find_open_slots(grid), grid, rng)
+    if profile is not None:
+        profile.lap("rank_slots")
+
+    for line, column, direction, pattern in ranked_slots:
+        if heap or time.monotonic() >= start_time + timeout or (max_tries is not None and tries >= max_tries):
+            break
+
+        matches = index.find_matches(pattern, words)
+        rng.shuffle(matches)
+        if profile is not None:
+            profile.lap("draw")
+
+        for word in matches:
+            if time.monotonic() >= start_time + timeout or (max_tries is not None and tries >= max_tries):
+                break
+            tries += 1
+
+            new = {"word": word, "location": [line, column], "D": direction}
+            invalidity = find_invalidity(new, grid)
+            if profile is not None:
+                profile.lap("validity")
+            if invalidity is not None:
+                if profile is not None:
+                    profile.count("rejected_" + invalidity)
+                continue
+            created_words = find_new_words(word, line, column, direction, grid, words)
+            if profile is not None:
+                profile.lap("new_words")
+            if created_words is None:
+                if profile is not None:
+                    profile.count("rejected_crossing")
+                continue
+
+            # The heap's smallest entry is the worst candidate kept so far.
+            # The number of tries keeps entries with the same score in order.
+            entry = (score_candidate(word, created_words), -tries, new, created_words)
+            if len(heap) < top_k:
+                heapq.heappush(heap, entry)
+            else:
+                heapq.heappushpop(heap, entry)
+            if profile is not None:
+                profile.lap("score")
+
+    if stats is not None:
+        stats["tries"] += tries
+
+    heap.sort(reverse=True)
+    return [x[2] for x in heap], [x[0] for x in heap], [x[3] for x in heap]
+
+
 def is_cell_free(line, col, grid):
     """ Checks whether a cell is free.
 
     Does not throw if the indices are out of bounds. These cases return as free.
     """
-    # Negative indices are "legal", but we treat them as out of bounds.
-    if line < 0 or col < 0:
-        return True
-
-    try:
-        return grid[line][col] == 0
-    except IndexError:
-        return True
+    return grid.is_free(line, col)
 
 
 def is_isolated(possibility, grid):
@@ -275,32 +572,75 @@ def is_isolated(possibility, grid):
     return True
 
 
-def basic_grid_fill(grid, occ_goal, timeout, dim, words):
+def basic_grid_fill(grid, occ_goal, timeout, dim, words, index, stop_condition=None, stats=None, rng=random, top_k=None, on_event=None,
+                    profile=None, stall_factor=STALL_FACTOR, sampler=None):
     """ Actually finds valid possibilities, scores them and adds them to the grid.
 
     Algorithm:
     This function operates by taking the words it receives randomly generating possibilities
     until a valid one is found. It is then added to the grid.
-    This is done until the grid is above a given completion level.
-    """
-    start_time = time.time()
-    occupancy = 0
-    added_words = []
+    This is done until the grid is above a given completion level, the
+    timeout expires, or the fill stalls: it gives up when no new word is found
+    in stall_factor times the (recent) number of draws it took to find the
+    previous ones. Stalls are counted in draws rather than seconds, so that a
+    seeded fill makes the same choices however loaded the machine is.
+
+    Possibilities are generated from the open slots of the grid, with the
+    word index (see generate_valid_candidates). If top_k is given, each new word is the best
+    of a batch of candidates for the most constrained slot.
 
-    while occupancy < occ_goal and time.time() - start_time < timeout:
-        # Generate some candidates
-        # This is limited to 1/10 of the total time we can use.
-        candidates, scores, new_words = generate_valid_candidates(grid, words, dim, timeout/10)
+    If a stop condition is given, it is called before each new word, and the
+    fill stops as soon as it returns True.
 
-        # If there are no candidates, we move to the next iteration. This ensures that we can actually respect timeouts.
+    If a stats dictionary is given, it keeps count of the "tries", and a
+    [time, occupancy] point is added to its "occupancy_curve" for every word.
+
+    If an event callback is given, it is called with "word" and the word,
+    the new words it created and its score, every time a word is added, and
+    with "stall" and the time it waited if the fill stalls (see
+    progress.EventSource.emit).
+
+    If a profiler is given, it times each stage of the fill, and counts why
+    candidates are rejected (see profiler.Profiler).
+
+    If a sampler is given, candidates favour words that are easy to cross
+    (see word_sampler.WordSampler).
+    """
+    deadline = time.monotonic() + timeout
+    occupancy = compute_occupancy(grid)
+    added_words = []
+    word_tries = None
+
+    while occupancy < occ_goal:
+        now = time.monotonic()
+        if now >= deadline:
+            break
+        if stop_condition is not None and stop_condition():
+            break
+
+        # Generate some candidates, for no more draws than it would take to stall
+        max_tries = max(MIN_STALL_TRIES, int(stall_factor*word_tries)) if word_tries is not None else None
+        draws = {"tries": 0}
+        candidates, scores, new_words = generate_valid_candidates(grid, words, dim, deadline - now, index, draws, rng, top_k, profile, sampler, max_tries)
+        if stats is not None:
+            stats["tries"] += draws["tries"]
+
+        # If there are no candidates, the fill has stalled (or run out of time)
         if not candidates:
-            continue
+            if profile is not None:
+                profile.count("stalls")
+            if on_event is not None and time.monotonic() < deadline:
+                on_event("stall", waited=time.monotonic() - now)
+            break
+
+        if profile is not None:
+            profile.start()
 
         # Select best candidate
-        new, new_score = select_candidate(candidates, scores)
+        new, new_score, new_words = select_candidate(candidates, scores, new_words)
 
         # Add word to grid and to the list of added words
-        add_word_to_grid(new, grid)
+        add_word_to_grid(new, grid, new_words)
         added_words.append(new)
 
         # Add new words to the words list
@@ -311,11 +651,24 @@ def basic_grid_fill(grid, occ_goal, timeout, dim, words):
         words.remove(new["word"])
         for word in new_words:
             words.remove(word["word"])
+        if profile is not None:
+            profile.lap("place")
+
+        # Keep track of how many draws words are taking, favouring the latest ones
+        if word_tries is None:
+            word_tries = draws["tries"]
+        else:
+            word_tries = 0.7*word_tries + 0.3*draws["tries"]
 
         # Update occupancy
         occupancy = compute_occupancy(grid)
-        print("Word \"{}\" added. Occupancy: {:2.3f}. Score: {}.".format(new["word"], occupancy, new_score))
-        if new_words:
-            print("This also created the words:", new_words)
+        if stats is not None:
+            stats["occupancy_curve"].append([time.monotonic(), occupancy])
+        if profile is not None:
+            profile.lap("occupancy")
+        if on_event is not None:
+            on_event("word", word=new, new_words=new_words, score=new_score)
+            if profile is not None:
+                profile.lap("events")
 
     return added_words
\ No newline at end of file
@@ -0,0 +1,58 @@
+import multiprocessing
+import random
+
+import basic_ops
+import worker_pool
+from worker_pool import worker_state
+
+
+def setup_worker(generator_class, generator_args, generator_kwargs):
+    """ Sets up a worker process of the pool (see worker_pool.init_worker).
+
+    The generator (and its word index) is built once per worker, and reused
+    for every puzzle that worker builds.
+    """
+    return {"generator": generator_class(*generator_args, **generator_kwargs)}
+
+
+def build_puzzle(task):
+    """ Builds a single puzzle with the worker's generator.
+    """
+    number, seed = task
+    generator = worker_state["generator"]
+    generator.set_seed(seed)
+
+    generator.profile = worker_pool.task_profile(getattr(generator, "profile", None))
+    generator.generate_grid()
+    return number, seed, generator.get_grid(), generator.get_words_in_grid(), generator.profile
+
+
+def generate_batch(generator_class, generator_args, n_puzzles, n_jobs=1, seed=None, generator_kwargs={}):
+    """ Generates several puzzles from a single dictionary.
+
+    Puzzles are yielded as (number, seed, grid, words_in_grid) tuples, as
+    soon as each one is finished. The seed of each puzzle is derived from the
+    given one, and can be used to build that puzzle again on its own. If more
+    than one job is requested, puzzles are built in a process pool, and may
+    therefore finish out of order.
+
+    Generators are built with the given positional and keyword arguments. If
+    a profiler is among them, it gets the sum of every puzzle's counts and times.
+    """
+    if seed is None:
+        seed = random.randrange(2**32)
+    seeds = [basic_ops.derive_seed(seed, number) for number in range(n_puzzles)]
+
+    if n_jobs > 1:
+        with multiprocessing.Pool(n_jobs, worker_pool.init_worker, (setup_worker, generator_class, generator_args, generator_kwargs)) as pool:
+            for number, puzzle_seed, grid, words_in_grid, profile in pool.imap_unordered(build_puzzle, enumerate(seeds)):
+                if profile is not None:
+                    generator_kwargs["profile"].merge(profile)
+                yield number, puzzle_seed, grid, words_in_grid
+        return
+
+    generator = generator_class(*generator_args, **generator_kwargs)
+    for number, puzzle_seed in enumerate(seeds):
+        generator.set_seed(puzzle_seed)
+        generator.generate_grid()
+        yield number, puzzle_seed, generator.get_grid(), generator.get_words_in_grid()
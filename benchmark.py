@@ -0,0 +1,249 @@
+#!/usr/bin/python3
+""" Benchmark
+
+This script runs every registered grid generator across a matrix of grid
+sizes, target occupancies, dictionary sizes and seeds, and writes the
+results to a JSON file, so that two revisions of the generators can be
+compared. Each run happens in a fresh process, so that its peak memory can
+be measured.
+
+Dictionaries are generated synthetically unless a word file is given, so the
+benchmark can run anywhere.
+"""
+
+# Standard imports
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import subprocess
+import time
+
+# Custom imports
+import file_ops
+from crossword_generator import algorithm_class_map
+from profiler import Profiler
+
+
+# Rough English letter frequencies, used to generate words
+VOWELS = {"a": 8.2, "e": 12.7, "i": 7.0, "o": 7.5, "u": 2.8}
+CONSONANTS = {"b": 1.5, "c": 2.8, "d": 4.3, "f": 2.2, "g": 2.0, "h": 6.1, "j": 0.2, "k": 0.8, "l": 4.0,
+              "m": 2.4, "n": 6.7, "p": 1.9, "q": 0.1, "r": 6.0, "s": 6.3, "t": 9.1, "v": 1.0, "w": 2.4,
+              "x": 0.2, "y": 2.0, "z": 0.1}
+
+
+def parse_cmdline_args():
+    """ Uses argparse to get commands line args.
+    """
+    parser = argparse.ArgumentParser(description='Benchmark the crossword generators.')
+    parser.add_argument('-a', type=str,
+                        nargs="+",
+                        default=sorted(algorithm_class_map),
+                        dest="algorithms",
+                        help="Algorithms to benchmark. Default is all of them.")
+    parser.add_argument('-d', type=int,
+                        nargs="+",
+                        default=[10, 20],
+                        dest="sizes",
+                        help="Sizes of the (square) grids to build.")
+    parser.add_argument('-o', type=float,
+                        nargs="+",
+                        default=[0.5, 0.7],
+                        dest="occupancies",
+                        help="Target occupancies.")
+    parser.add_argument('-w', type=int,
+                        nargs="+",
+                        default=[10000, 50000],
+                        dest="dict_sizes",
+                        help="Dictionary sizes, in words.")
+    parser.add_argument('-s', type=int,
+                        nargs="+",
+                        default=[0, 1, 2],
+                        dest="seeds",
+                        help="Seeds for each run.")
+    parser.add_argument('-t', type=int,
+                        default=5,
+                        dest="timeout",
+                        help="Maximum execution time, in seconds, per run.")
+    parser.add_argument('-f', type=str,
+                        default=None,
+                        dest="word_file",
+                        help="Sample dictionaries from this word file instead of generating them.")
+    parser.add_argument('-r', type=str,
+                        default="benchmark.json",
+                        dest="out_json",
+                        help="Name of the output JSON file.")
+    parser.add_argument('--profile', action="store_true",
+                        dest="profile",
+                        help="Also record the time spent in each stage of the search, and the reasons candidates are rejected.")
+    parser.add_argument('--compare', type=str,
+                        nargs=2,
+                        default=None,
+                        metavar=("OLD", "NEW"),
+                        help="Compare two result files instead of running the benchmark.")
+
+    return parser.parse_args()
+
+
+def generate_synthetic_words(n_words, seed, min_length=3, max_length=12):
+    """ Generates a list of made-up, vaguely pronounceable words.
+
+    Words alternate between consonants and vowels, drawn with their English
+    frequencies, so that they cross each other about as often as real words do.
+    """
+    rng = random.Random(seed)
+    vowels, vowel_weights = list(VOWELS), list(VOWELS.values())
+    consonants, consonant_weights = list(CONSONANTS), list(CONSONANTS.values())
+    words = set()
+
+    while len(words) < n_words:
+        length = rng.randint(min_length, max_length)
+        vowel = rng.random() < 0.3
+        letters = []
+        for _ in range(length):
+            if vowel:
+                letters.append(rng.choices(vowels, vowel_weights)[0])
+            else:
+                letters.append(rng.choices(consonants, consonant_weights)[0])
+            # Mostly alternate, with the odd consonant cluster
+            vowel = not vowel if rng.random() < 0.8 else vowel
+        words.add("".join(letters))
+
+    return sorted(words)
+
+
+def get_dictionary(n_words, seed, word_file=None):
+    """ Returns a dictionary with the given number of words, either sampled
+    from the word file or generated.
+    """
+    if word_file is None:
+        return generate_synthetic_words(n_words, seed)
+
+    words = file_ops.read_word_list(word_file)
+    if n_words >= len(words):
+        return words
+    return random.Random(seed).sample(words, n_words)
+
+
+def run_case(case):
+    """ Runs a single benchmark case, and returns its results.
+
+    This is meant to run in a fresh process, so that the peak memory it
+    reports belongs to this case alone.
+    """
+    words = get_dictionary(case["dict_size"], case["seed"], case["word_file"])
+
+    profile = Profiler() if case["profile"] else None
+
+    start_time = time.monotonic()
+    generator = algorithm_class_map[case["algorithm"]](words, [case["size"], case["size"]], 1, case["timeout"], case["target_occupancy"], seed=case["seed"],
+                                                       profile=profile)
+    setup_time = time.monotonic() - start_time
+    generator.generate_grid()
+    wall_time = time.monotonic() - start_time
+
+    stats = generator.get_stats()
+    result = {key: case[key] for key in ("algorithm", "size", "target_occupancy", "dict_size", "seed", "timeout")}
+    result["setup_time"] = setup_time
+    result["wall_time"] = wall_time
+    result["occupancy"] = generator.get_grid().occupancy()
+    result["tries"] = stats["tries"]
+    result["tries_per_second"] = stats["tries"] / wall_time if wall_time > 0 else 0
+    result["occupancy_curve"] = [[point_time - start_time, occupancy] for point_time, occupancy in stats["occupancy_curve"]]
+    # Every point of the curve is a word added (or a fuller grid found)
+    result["placements"] = len(stats["occupancy_curve"])
+    result["placement_latency"] = (wall_time - setup_time) / result["placements"] if result["placements"] else None
+    # (kilobytes on Linux)
+    result["peak_memory"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if profile is not None:
+        result["profile"] = profile.to_dict()
+    return result
+
+
+def get_revision():
+    """ Returns the current git revision, if there is one.
+    """
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(args):
+    """ Runs every case in the matrix, and writes the results out.
+    """
+    cases = []
+    for algorithm in args.algorithms:
+        for size in args.sizes:
+            for target_occupancy in args.occupancies:
+                for dict_size in args.dict_sizes:
+                    for seed in args.seeds:
+                        cases.append({"algorithm": algorithm, "size": size, "target_occupancy": target_occupancy,
+                                      "dict_size": dict_size, "seed": seed, "timeout": args.timeout,
+                                      "word_file": args.word_file, "profile": args.profile})
+
+    results = []
+    context = multiprocessing.get_context("spawn")
+    for number, case in enumerate(cases):
+        # A new process per case keeps memory measurements apart
+        with context.Pool(1) as pool:
+            result = pool.apply(run_case, (case,))
+        results.append(result)
+        print("[{}/{}] {} {}x{}, occupancy {} with {} words, seed {}: reached {:2.3f} in {:.2f}s, {:.0f} tries/s, {:.2f}ms per word, {} KB.".format(
+              number+1, len(cases), result["algorithm"], result["size"], result["size"], result["target_occupancy"],
+              result["dict_size"], result["seed"], result["occupancy"], result["wall_time"],
+              result["tries_per_second"], 1000*(result["placement_latency"] or 0), result["peak_memory"]))
+
+    with open(args.out_json, "w") as json_file:
+        json.dump({"revision": get_revision(),
+                   "python": platform.python_version(),
+                   "machine": platform.machine(),
+                   "results": results}, json_file, indent=1)
+    print("Results written to {}.".format(args.out_json))
+
+
+def compare_results(old_file, new_file):
+    """ Prints how the mean wall time, occupancy, time per word and memory of
+    each configuration changed between two result files.
+    """
+    summaries = []
+    for filename in (old_file, new_file):
+        with open(filename) as json_file:
+            results = json.load(json_file)["results"]
+
+        # Average over seeds
+        summary = {}
+        for result in results:
+            key = (result["algorithm"], result["size"], result["target_occupancy"], result["dict_size"])
+            summary.setdefault(key, []).append(result)
+        summaries.append(summary)
+
+    for key in sorted(set(summaries[0]) & set(summaries[1])):
+        line = "{} {}x{}, occupancy {} with {} words:".format(key[0], key[1], key[1], key[2], key[3])
+        for field in ("wall_time", "occupancy", "placement_latency", "peak_memory"):
+            # Older result files may lack some fields
+            old_values = [x[field] for x in summaries[0][key] if x.get(field) is not None]
+            new_values = [x[field] for x in summaries[1][key] if x.get(field) is not None]
+            if not old_values or not new_values:
+                continue
+            old = sum(old_values) / len(old_values)
+            new = sum(new_values) / len(new_values)
+            line += " {} {:.3f} -> {:.3f} ({:+.1f}%).".format(field, old, new, 100*(new-old)/old if old else 0)
+        print(line)
+
+
+def main():
+    args = parse_cmdline_args()
+
+    if args.compare:
+        compare_results(*args.compare)
+    else:
+        run_benchmark(args)
+
+
+if __name__ == "__main__":
+    main()
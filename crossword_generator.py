@@ -8,11 +8,24 @@ paper, if you're one of those people.
 
 # Standard imports
 import argparse
+import os
 
 # Custom imports
+import batch_generator
 import file_ops
 import grid_generator
+import progress
+from profiler import Profiler
+from anneal_generator import AnnealingGenerator
+from csp_generator import CSPGenerator
 from grid_generator import GridGenerator
+from parallel_generator import ParallelGenerator
+
+
+# Generator classes for each algorithm
+algorithm_class_map = {"basic": GridGenerator,
+                       "anneal": AnnealingGenerator,
+                       "csp": CSPGenerator}
 
 
 def parse_cmdline_args():
@@ -35,11 +48,11 @@ def parse_cmdline_args():
     parser.add_argument('-t', type=int,
                         default=10,
                         dest="timeout",
-                        help="Maximum execution time, in seconds, per execution loop.")
+                        help="Maximum execution time, in seconds, per execution loop. The whole run ends within this times the number of loops.")
     parser.add_argument('-o', type=float,
                         default=1.0,
                         dest="target_occ",
-                        help="Desired occupancy of the final grid. Default is 1.0, which just uses all of the allotted time.")
+                        help="Desired occupancy of the final grid. Default is 1.0, in which case the search runs until the time is up or the fill stalls.")
     parser.add_argument('-p', type=str,
                         default="out.pdf",
                         dest="out_pdf",
@@ -47,43 +60,242 @@ def parse_cmdline_args():
     parser.add_argument('-a', type=str,
                         default="basic",
                         dest="algorithm",
-                        help="The algorithm to use.")
+                        help="The algorithm to use: basic, anneal (basic, then improved by simulated annealing once it stalls) or csp.")
+    parser.add_argument('-j', '--jobs', type=int,
+                        default=1,
+                        dest="jobs",
+                        help="Number of independent searches to run in parallel. The best grid is kept. In batch mode, the number of puzzles built in parallel.")
+    parser.add_argument('-b', '--batch', type=int,
+                        default=0,
+                        dest="batch",
+                        help="Generate this many puzzles from the same word list, instead of a single one.")
+    parser.add_argument('--jsonl', type=str,
+                        default="puzzles.jsonl",
+                        dest="out_jsonl",
+                        help="In batch mode, file where each puzzle is written as a line of JSON as soon as it is finished.")
+    parser.add_argument('--format', type=str,
+                        nargs="+",
+                        default=["pdf"],
+                        choices=["pdf"] + sorted(file_ops.export_formats),
+                        dest="formats",
+                        help="Formats to write the puzzle in: pdf (compiled with LaTeX), json, puz (Across Lite) or svg. Files other than the pdf are named after it, e.g. out.svg. In batch mode, one file is written per puzzle in each of them, e.g. out_0003.svg, as soon as it is finished.")
+    parser.add_argument('--no-pdf', action="store_true",
+                        dest="no_pdf",
+                        help="Do not compile a PDF. In batch mode, all puzzles are otherwise compiled into a single PDF at the end.")
+    parser.add_argument('--split-pdf', action="store_true",
+                        dest="split_pdf",
+                        help="In batch mode, compile one PDF per puzzle in the background as each one is finished, instead of a single one at the end.")
+    parser.add_argument('--latex-compiler', type=str,
+                        default="pdflatex",
+                        dest="latex_compiler",
+                        help="The latex compiler to use. \"stub\" skips compilation and writes the latex source instead, for testing without TeX.")
+    parser.add_argument('--render-jobs', type=int,
+                        default=2,
+                        dest="render_jobs",
+                        help="In batch mode, number of PDFs to compile at the same time.")
+    parser.add_argument('--top-k', type=int,
+                        default=None,
+                        dest="top_k",
+                        help="With the basic and anneal algorithms, evaluate every word that fits the most constrained slot at each step, and keep the best TOP_K, instead of adding the first word that fits.")
+    parser.add_argument('--largest-component', action="store_true",
+                        dest="keep_largest_component",
+                        help="With the basic and anneal algorithms, keep only the largest group of connected words after each loop, instead of only removing isolated words.")
+    parser.add_argument('--profile', type=str,
+                        nargs="?",
+                        default=None,
+                        const="profile.json",
+                        dest="profile",
+                        help="Time each stage of the search and count why candidates are rejected, then print a summary and write it to a JSON file (profile.json by default).")
+    parser.add_argument('--template', type=str,
+                        default=None,
+                        dest="template",
+                        help="Fill the grid in this file, with one line of the grid per line, \".\" for empty cells, \"#\" for blocked cells and letters that must stay. Sets the dimensions of the grid. The csp algorithm fills the slots between blocked cells.")
+    parser.add_argument('--checkpoint', type=str,
+                        default=None,
+                        dest="checkpoint",
+                        help="With the basic and anneal algorithms, save the state of the search to this file as it goes, so that it can be resumed.")
+    parser.add_argument('--resume', type=str,
+                        default=None,
+                        dest="resume",
+                        help="With the basic and anneal algorithms, continue the search saved in this checkpoint file.")
+    parser.add_argument('--seed', type=int,
+                        default=None,
+                        dest="seed",
+                        help="Seed for the random number generator, to replay a previous run. A random one is picked by default.")
 
     return parser.parse_args()
 
 
-def create_generator(algorithm, word_list, dimensions, n_loops, timeout, target_occupancy):
-    """ Constructs the generator object for the given algorithm.
+# Options that only the basic algorithm understands, and their command line names
+basic_options = {"top_k": "--top-k",
+                 "keep_largest_component": "--largest-component"}
+
+
+def builds_on_basic(algorithm):
+    """ Checks whether an algorithm builds on the basic one (see GridGenerator),
+    and so understands its options.
+    """
+    return issubclass(algorithm_class_map.get(algorithm, object), GridGenerator)
+
+
+def get_generator_kwargs(algorithm, word_index=None, profile=None, **options):
+    """ Returns the keyword arguments to build the generators of the given algorithm with.
+
+    If a word index is given, generators use it instead of building their own.
+    If a profiler is given, generators record their stages in it. Any other
+    options that are set are passed on, unless the algorithm does not
+    understand them (see basic_options).
     """
-    algorithm_class_map = {"basic": GridGenerator}
+    generator_kwargs = {"word_index": word_index, "profile": profile}
+    for name, value in options.items():
+        if value is None or value is False:
+            continue
+        if not builds_on_basic(algorithm) and name in basic_options:
+            print("Ignoring {}, which only applies to the basic and anneal algorithms.".format(basic_options[name]))
+            continue
+        generator_kwargs[name] = value
+    return generator_kwargs
+
+
+def create_generator(algorithm, word_list, dimensions, n_loops, timeout, target_occupancy, jobs=1, seed=None, word_index=None, profile=None, **options):
+    """ Constructs the generator object for the given algorithm.
+
+    If a word index is given, the generator uses it instead of building its
+    own. Other options are passed on to the generator (see get_generator_kwargs).
 
+    If more than one job is requested, the generator runs that many searches
+    in parallel (see ParallelGenerator).
+    """
+    generator_kwargs = get_generator_kwargs(algorithm, word_index, profile, **options)
     try:
-        return algorithm_class_map[algorithm](word_list, dimensions, n_loops, timeout, target_occupancy)
+        if jobs > 1:
+            return ParallelGenerator(algorithm_class_map[algorithm], jobs, word_list, dimensions, n_loops, timeout, target_occupancy, seed, **generator_kwargs)
+        return algorithm_class_map[algorithm](word_list, dimensions, n_loops, timeout, target_occupancy, seed=seed, **generator_kwargs)
     except KeyError:
         print("Could not create generator object for unknown algorithm: {}.".format(algorithm))
 
 
+def generate_batch(args, words, dimensions, word_index=None, profile=None, template=None):
+    """ Generates a batch of puzzles from the same word list.
+
+    Puzzles are streamed to a JSONL file as they are finished, along with
+    their files in the other export formats asked for, and compiled into a
+    single PDF at the end. If split PDFs are requested, each puzzle is
+    instead compiled in the background as soon as it is finished, while the
+    next ones are generated.
+    """
+    if args.algorithm not in algorithm_class_map:
+        print("Could not create generator object for unknown algorithm: {}.".format(args.algorithm))
+        return
+
+    generator_class = algorithm_class_map[args.algorithm]
+    generator_args = (words, dimensions, args.n_loops, args.timeout, args.target_occ)
+    generator_kwargs = get_generator_kwargs(args.algorithm, word_index, profile, top_k=args.top_k, keep_largest_component=args.keep_largest_component,
+                                            template=template)
+    puzzles = []
+
+    pdf_name, pdf_extension = os.path.splitext(args.out_pdf)
+
+    with file_ops.RenderQueue(args.render_jobs, compiler=args.latex_compiler) as render_queue, open(args.out_jsonl, "w") as jsonl_file:
+        for number, seed, grid, words_in_grid in batch_generator.generate_batch(generator_class, generator_args, args.batch, args.jobs, args.seed, generator_kwargs):
+            file_ops.write_grid_to_jsonl(jsonl_file, grid, words_in_grid, puzzle=number, seed=seed, occupancy=grid.occupancy())
+            for export_format in export_formats(args):
+                file_ops.export_grid(grid, words_in_grid, export_format, "{}_{:04d}.{}".format(pdf_name, number, export_format))
+            print("Puzzle {} done, with occupancy {:2.3f}.".format(number, grid.occupancy()))
+
+            if args.no_pdf or "pdf" not in args.formats:
+                continue
+            if args.split_pdf:
+                render_queue.submit([(grid, [x["word"] for x in words_in_grid])], "{}_{:04d}{}".format(pdf_name, number, pdf_extension))
+            else:
+                puzzles.append((number, grid, [x["word"] for x in words_in_grid]))
+
+        # Compile all puzzles in order
+        if puzzles:
+            puzzles.sort(key=lambda puzzle: puzzle[0])
+            render_queue.submit([(grid, words) for _, grid, words in puzzles], args.out_pdf)
+
+
+def export_formats(args):
+    """ Returns the formats, other than the PDF, that the puzzles are to be written in.
+    """
+    return [export_format for export_format in dict.fromkeys(args.formats) if export_format != "pdf"]
+
+
+def write_profile(profile, out_json):
+    """ Prints the summary of a profiler, if there is one, and writes it to a JSON file.
+    """
+    if profile is None:
+        return
+
+    print("Profile:")
+    print(profile.summary())
+    profile.write_json(out_json)
+    print("Profile written to {}.".format(out_json))
+
+
 def main():
     # Parse args
     args = parse_cmdline_args()
 
-    # Read words from file
-    words = file_ops.read_word_list(args.word_file)
-    print("Read {} words from file.".format(len(words)))
+    # Read words from file, or from its compiled index. Generators use every
+    # word of the index, which worker processes map instead of copying
+    word_index = file_ops.load_word_index(args.word_file)
+    words = None
+    print("Read {} words from file.".format(len(word_index)))
+
+    profile = Profiler() if args.profile else None
 
     # Construct the generator object
     dim = args.dim if len(args.dim)==2 else [args.dim[0], args.dim[0]]
-    generator = create_generator(args.algorithm, words, dim, args.n_loops, args.timeout, args.target_occ)
+    template = None
+    if args.template:
+        template = file_ops.read_template(args.template)
+        dim = [len(template), len(template[0])]
+    if args.batch:
+        generate_batch(args, words, dim, word_index, profile, template)
+        write_profile(profile, args.profile)
+        return
+
+    # Checkpoints hold the state of a single basic search
+    state = None
+    if (args.checkpoint or args.resume) and (not builds_on_basic(args.algorithm) or args.jobs > 1):
+        print("Ignoring --checkpoint and --resume, which only apply to the basic and anneal algorithms with a single job.")
+        args.checkpoint = args.resume = None
+    if args.resume:
+        state = file_ops.read_checkpoint(args.resume)
+        dim = state["dimensions"]
+
+    generator = create_generator(args.algorithm, words, dim, args.n_loops, args.timeout, args.target_occ, args.jobs, args.seed, word_index, profile,
+                                 top_k=args.top_k, keep_largest_component=args.keep_largest_component, template=template)
     if not generator:
         return
 
-    # Generate the grid
-    generator.generate_grid()
+    if state is not None:
+        try:
+            generator.set_state(state)
+        except ValueError as error:
+            print("Could not resume from {}: {}.".format(args.resume, error))
+            return
+        print("Resuming from {}, with occupancy {:2.3f}.".format(args.resume, generator.get_grid().occupancy()))
+
+    # Generate the grid, reporting progress on the console
+    generator.subscribe(progress.ConsoleReporter())
+    if args.checkpoint:
+        generator.subscribe(progress.Checkpointer(generator, args.checkpoint))
+    if state is not None:
+        generator.generate_grid(resume=True)
+    else:
+        generator.generate_grid()
+    write_profile(profile, args.profile)
 
     # Write it out
     grid = generator.get_grid()
     words_in_grid = generator.get_words_in_grid()
-    file_ops.write_grid_to_file(grid, words=[x["word"] for x in words_in_grid], out_pdf=args.out_pdf)
+    for export_format in export_formats(args):
+        file_ops.export_grid(grid, words_in_grid, export_format, "{}.{}".format(os.path.splitext(args.out_pdf)[0], export_format))
+    if not args.no_pdf and "pdf" in args.formats:
+        file_ops.write_grid_to_file(grid, words=[x["word"] for x in words_in_grid], out_pdf=args.out_pdf, compiler=args.latex_compiler)
     file_ops.write_grid_to_screen(grid, words_in_grid)
 
 
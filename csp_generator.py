@@ -0,0 +1,373 @@
+import random
+import time
+
+import basic_ops
+import slot_ops
+from progress import EventSource
+from word_index import WordIndex
+from word_store import WordStore
+
+
+class OutOfTime(Exception):
+    """ Raised to unwind the search when it runs out of time or is asked to stop.
+    """
+
+
+class CSPGenerator(EventSource):
+    """ Fills a grid by treating it as a constraint satisfaction problem.
+
+    The grid is laid out as a lattice of slots (see slot_ops), which are the
+    variables of the problem, and the words that fit each of them are their
+    domains. Slots are filled by a backtracking search that:
+     -> always fills the slot with the fewest fitting words first;
+     -> checks, after placing a word, that every slot crossing it can still be
+     filled (forward checking);
+     -> when a slot cannot be filled, jumps straight back to the latest slot
+     that caused the conflict, instead of the previous one (conflict-directed
+     backjumping).
+
+    If a template is given (see Grid.add_template), its blocked cells make up
+    the pattern instead of the lattice, and its letters are kept: slots they
+    already fill are left as they are.
+
+    The words of each slot are tried in an order drawn from the seed, so the
+    same words, dimensions and seed always produce the same grid, and
+    different seeds different ones. The search runs until every slot is
+    filled, the target occupancy is reached or the time runs out, in which
+    case the fullest grid found so far is kept.
+
+    Slots without any letters yet are not given a domain until they are
+    filled, since every word of their length would fit them: the search
+    only keeps the words of the slots it has narrowed down.
+    """
+    # Longest word the lattice makes room for
+    max_slot_length = 11
+
+    def __init__(self, word_list, dimensions, n_loops, timeout, target_occupancy, stop_condition=None, seed=None, word_index=None, profile=None,
+                 template=None):
+        self.dimensions = dimensions
+        self.n_loops = n_loops
+        self.timeout = timeout
+        self.target_occupancy = target_occupancy
+        self.init_events(stop_condition)
+        self.profile = profile
+        self.rng = random.Random()
+        self.set_seed(seed)
+        self.template = template
+        # Every word of a given index is available, unless a word list is given too
+        self.word_index = word_index if word_index is not None else WordIndex(word_list)
+        self.word_list = WordStore(self.word_index, word_list if word_index is not None else None)
+
+        # The slot table is computed once, from the template or the lattice
+        if template is not None:
+            blocked = slot_ops.find_blocked_cells(template)
+        else:
+            blocked = slot_ops.create_lattice_pattern(dimensions, self.word_index.lengths, self.max_slot_length)
+        self.slots = slot_ops.find_slots(dimensions, blocked)
+        self.reset()
+
+    def get_grid(self):
+        return self.grid
+
+    def get_words_in_grid(self):
+        return self.words_in_grid
+
+    def set_seed(self, seed=None):
+        """ Seeds the generator's random number generator, which orders the
+        words tried in each slot. If no seed is given, a random one is picked,
+        so that the search can still be replayed later.
+        """
+        self.seed = seed if seed is not None else random.randrange(2**32)
+        self.rng.seed(self.seed)
+
+    def get_stats(self):
+        """ Returns the statistics of the last search: the number of words
+        tried, and the occupancy of the fullest grid over time, as
+        [time, occupancy] points.
+        """
+        return self.stats
+
+    def generate_grid(self):
+        """ Updates the internal grid with content.
+
+        This is the main outward-facing function
+        """
+        self.reset()
+        self.emit("start", dimensions=self.dimensions, words=len(self.word_list), seed=self.seed, slots=len(self.slots))
+
+        # There are no loops to speak of, so the search gets all of their time
+        self.deadline = time.monotonic() + self.timeout*self.n_loops
+
+        try:
+            for slot in range(len(self.slots)):
+                if self.is_out_of_time():
+                    raise OutOfTime()
+                if slot in self.fixed_slots:
+                    continue
+                self.domains[slot] = self.find_domain(slot) if self.has_letters(slot) else None
+
+            if self.search() is None:
+                self.emit("search", reason="finished", nodes=self.nodes)
+            else:
+                self.emit("search", reason="exhausted the search space", nodes=self.nodes)
+        except OutOfTime:
+            self.emit("search", reason="ran out of time", nodes=self.nodes)
+
+        # Go back to the fullest grid we found (see record_best)
+        if self.grid.filled < self.best_filled:
+            self.grid = self.create_grid()
+            for possibility in self.best:
+                basic_ops.add_word_to_grid(possibility, self.grid)
+            self.words_in_grid = list(self.fixed_slots.values()) + self.best
+        else:
+            self.words_in_grid = list(self.fixed_slots.values()) + list(self.assignment.values())
+        self.words_in_grid += self.completed_slots()
+
+        self.emit("done")
+
+    def reset(self):
+        """ Starts over with an empty grid, with every word available again.
+
+        Slots that the template fills completely are set aside as they are,
+        and their words are not used anywhere else.
+        """
+        self.grid = self.create_grid()
+        self.words_in_grid = []
+        self.word_list.restore()
+        self.fixed_slots = {}
+        for slot in range(len(self.slots)):
+            line, column = self.slots[slot]["location"]
+            pattern = basic_ops.get_slot_pattern(line, column, self.slots[slot]["D"], self.slots[slot]["length"], self.grid)
+            if None not in pattern:
+                word = "".join(pattern)
+                self.fixed_slots[slot] = {"word": word, "location": self.slots[slot]["location"], "D": self.slots[slot]["D"]}
+                if word in self.word_list:
+                    self.word_list.remove(word)
+        self.assignment = {}
+        self.domains = {}
+        self.best = []
+        self.best_filled = 0
+        self.nodes = 0
+        self.stats = {"tries": 0, "occupancy_curve": []}
+        self.stop_requested = False
+        self.start_time = time.monotonic()
+
+    def create_grid(self):
+        """ Creates an empty grid, but for the template's blocks and letters.
+        """
+        grid = basic_ops.create_empty_grid(self.dimensions)
+        if self.template is not None:
+            grid.add_template(self.template)
+        return grid
+
+    def completed_slots(self):
+        """ Returns the words of the slots that were never filled, but whose
+        cells crossing words filled anyway, when they spell a word.
+
+        The search can stop before it gets to them (e.g. once the target
+        occupancy is reached), and they still have to be listed.
+        """
+        filled = {(tuple(word["location"]), word["D"]) for word in self.words_in_grid}
+        words = []
+        for slot in self.slots:
+            if (tuple(slot["location"]), slot["D"]) in filled:
+                continue
+            line, column = slot["location"]
+            pattern = basic_ops.get_slot_pattern(line, column, slot["D"], slot["length"], self.grid)
+            if None not in pattern and self.word_index.word_id("".join(pattern)) is not None:
+                words.append({"word": "".join(pattern), "location": slot["location"], "D": slot["D"]})
+        return words
+
+    def has_letters(self, slot):
+        """ Checks whether any cell of the given slot holds a letter.
+        """
+        line, column = self.slots[slot]["location"]
+        pattern = basic_ops.get_slot_pattern(line, column, self.slots[slot]["D"], self.slots[slot]["length"], self.grid)
+        return any(letter is not None for letter in pattern)
+
+    def domain_size(self, slot):
+        """ Returns the number of words left for the given slot, or, for a slot
+        without any letters, the number of words of its length.
+        """
+        domain = self.domains[slot]
+        if domain is None:
+            return len(self.word_index.by_length.get(self.slots[slot]["length"], ()))
+        return len(domain)
+
+    def find_domain(self, slot):
+        """ Returns the available words that fit the given slot, given the letters already in the grid.
+        """
+        line, column = self.slots[slot]["location"]
+        pattern = basic_ops.get_slot_pattern(line, column, self.slots[slot]["D"], self.slots[slot]["length"], self.grid)
+        return self.word_index.find_matches(pattern, self.word_list)
+
+    def culprits(self, slot):
+        """ Returns the filled slots that restrict the domain of the given slot:
+        the ones that cross it, and the ones that hold words that would
+        otherwise fit it, since each word is only used once.
+        """
+        culprits = {other for _, other, _ in self.slots[slot]["crossings"] if other in self.assignment}
+
+        line, column = self.slots[slot]["location"]
+        pattern = basic_ops.get_slot_pattern(line, column, self.slots[slot]["D"], self.slots[slot]["length"], self.grid)
+        for other, possibility in self.assignment.items():
+            word = possibility["word"]
+            if len(word) == len(pattern) and all(letter is None or letter == word[position] for position, letter in enumerate(pattern)):
+                culprits.add(other)
+
+        return culprits
+
+    def assign(self, slot, word):
+        """ Places a word in a slot.
+        """
+        possibility = {"word": word, "location": self.slots[slot]["location"], "D": self.slots[slot]["D"]}
+        basic_ops.add_word_to_grid(possibility, self.grid)
+        self.word_list.remove(word)
+        self.assignment[slot] = possibility
+        self.stats["tries"] += 1
+
+    def record_best(self):
+        """ Keeps the grid as the fullest one, if it is. Only grids whose
+        words passed forward checking are kept, so that no slot of the kept
+        grid is left with letters that spell no word.
+        """
+        if self.grid.filled > self.best_filled:
+            self.best_filled = self.grid.filled
+            self.best = list(self.assignment.values())
+            self.stats["occupancy_curve"].append([time.monotonic(), self.grid.occupancy()])
+            self.emit("best")
+
+    def unassign(self, slot, saved_domains):
+        """ Takes the word out of a slot, and restores the domains of the slots that cross it.
+        """
+        self.grid.undo()
+        self.word_list.add(self.assignment.pop(slot)["word"])
+        self.domains.update(saved_domains)
+
+    def forward_check(self, slot):
+        """ Updates the domains of the empty slots that cross the given one.
+
+        Returns the first slot left without any fitting words (or None), and
+        the domains that were replaced, so they can be restored.
+        """
+        saved_domains = {}
+        for _, other, _ in self.slots[slot]["crossings"]:
+            if other not in self.domains:
+                continue
+            saved_domains[other] = self.domains[other]
+            self.domains[other] = self.find_domain(other)
+            if not self.domains[other]:
+                return other, saved_domains
+
+        return None, saved_domains
+
+    def is_out_of_time(self):
+        if self.should_stop():
+            return True
+        return time.monotonic() > self.deadline
+
+    def search(self):
+        """ Fills the remaining slots.
+
+        Returns None if the grid was filled, otherwise the set of filled
+        slots that are to blame for the failure.
+
+        The search keeps its own stack, with one frame per filled slot (the
+        slot, its words, the next one to try, the domains the current word
+        replaced, and the slots to blame so far), so the number of slots it
+        can fill is not bounded by Python's recursion limit. Jumping back to
+        the latest slot to blame pops every frame above it.
+        """
+        stack = []
+        descend = True
+        result = None
+        while True:
+            if descend:
+                self.nodes += 1
+                if self.is_out_of_time():
+                    raise OutOfTime()
+
+                # Are we done?
+                if not self.domains or self.grid.occupancy() >= self.target_occupancy:
+                    return None
+
+                # Fill the most constrained slot first
+                if self.profile is not None:
+                    self.profile.start()
+                slot = min(self.domains, key=self.domain_size)
+                domain = self.domains.pop(slot)
+                if domain is None:
+                    domain = self.find_domain(slot)
+                self.rng.shuffle(domain)
+                stack.append({"slot": slot, "domain": domain, "next": 0, "saved_domains": None, "conflicts": set()})
+                if self.profile is not None:
+                    self.profile.lap("select_slot")
+                descend = False
+
+            frame = stack[-1]
+            slot = frame["slot"]
+
+            # The slots after this one could not be filled
+            if result is not None:
+                # If this slot is not to blame, trying other words here is pointless
+                if slot not in result:
+                    if self.profile is not None:
+                        self.profile.count("backjumps")
+                    self.unassign(slot, frame["saved_domains"])
+                    self.domains[slot] = frame["domain"]
+                    stack.pop()
+                    if not stack:
+                        return result
+                    continue
+
+                frame["conflicts"] |= result
+                result = None
+                if self.profile is not None:
+                    self.profile.start()
+                self.unassign(slot, frame["saved_domains"])
+                if self.profile is not None:
+                    self.profile.lap("undo")
+
+            domain = frame["domain"]
+            while frame["next"] < len(domain):
+                word = domain[frame["next"]]
+                frame["next"] += 1
+
+                # The word may have been used elsewhere since the domain was found
+                if word not in self.word_list:
+                    continue
+
+                if self.profile is not None:
+                    self.profile.start()
+                self.assign(slot, word)
+                if self.profile is not None:
+                    self.profile.lap("place")
+                wiped_out, saved_domains = self.forward_check(slot)
+                if self.profile is not None:
+                    self.profile.lap("forward_check")
+
+                if wiped_out is None:
+                    self.record_best()
+                    frame["saved_domains"] = saved_domains
+                    descend = True
+                    break
+
+                if self.profile is not None:
+                    self.profile.count("rejected_wipe_out")
+                frame["conflicts"] |= self.culprits(wiped_out)
+                if self.profile is not None:
+                    self.profile.start()
+                self.unassign(slot, saved_domains)
+                if self.profile is not None:
+                    self.profile.lap("undo")
+
+            if descend:
+                continue
+
+            # Nothing fits: blame whatever restricts this slot, and whatever restricted the slots after it
+            self.domains[slot] = domain
+            result = frame["conflicts"] | self.culprits(slot)
+            result.discard(slot)
+            stack.pop()
+            if not stack:
+                return result
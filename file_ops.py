@@ -1,8 +1,17 @@
+import concurrent.futures
+import hashlib
+import io
+import json
 import os
 import pprint
 import shutil
 import subprocess
 import tempfile
+import threading
+import xml.sax.saxutils
+
+from grid import BLOCK
+from word_index import WordIndex
 
 
 def read_word_list(filename, min_length=2, min_different_letters=2):
@@ -23,7 +32,73 @@ def read_word_list(filename, min_length=2, min_different_letters=2):
     return words
 
 
-def write_grid_to_file(grid, out_file="table.tex", out_pdf="out.pdf", keep_tex=False, words=[]):
+def load_word_index(filename, min_length=2, min_different_letters=2, index_file=None):
+    """ Returns a WordIndex for the words in the given file (see read_word_list).
+
+    The index is compiled to a binary file (by default, the word file's name
+    with ".idx" appended) the first time, and loaded straight from it on
+    later runs, as long as the word file and the filtering options stay the
+    same.
+    """
+    if index_file is None:
+        index_file = filename + ".idx"
+
+    # The index depends on the words and on how they were filtered
+    source_hash = hashlib.sha256()
+    with open(filename, "rb") as words_file:
+        source_hash.update(words_file.read())
+    source_hash.update("{}:{}".format(min_length, min_different_letters).encode())
+    source_hash = source_hash.hexdigest()
+
+    index = WordIndex.load(index_file, source_hash)
+    if index is not None:
+        return index
+
+    index = WordIndex(read_word_list(filename, min_length, min_different_letters))
+    try:
+        index.save(index_file, source_hash)
+    except OSError:
+        print("Could not save compiled word index to {}.".format(index_file))
+
+    return index
+
+
+def read_template(filename):
+    """ Reads a template grid from a file, with one line of the grid per line
+    of the file, "." for empty cells and "#" for blocked cells (as the grids
+    written by grid_to_dict).
+
+    Raises ValueError if the lines are not all the same length.
+    """
+    with open(filename, encoding='latin1') as template_file:
+        rows = [line.strip() for line in template_file if line.strip()]
+
+    if not rows or any(len(row) != len(rows[0]) for row in rows):
+        raise ValueError("{} is not a rectangular grid".format(filename))
+
+    return rows
+
+
+def write_checkpoint(filename, state):
+    """ Writes the state of a search to a JSON file (see GridGenerator.get_state).
+
+    The file is replaced at once, so an interrupted write never leaves a
+    broken checkpoint behind.
+    """
+    temp_filename = filename + ".tmp"
+    with open(temp_filename, "w") as checkpoint_file:
+        json.dump(state, checkpoint_file)
+    os.replace(temp_filename, filename)
+
+
+def read_checkpoint(filename):
+    """ Reads the state of a search written by write_checkpoint.
+    """
+    with open(filename) as checkpoint_file:
+        return json.load(checkpoint_file)
+
+
+def write_grid_to_file(grid, out_file="table.tex", out_pdf="out.pdf", keep_tex=False, words=[], compiler="pdflatex"):
     """ This function receives the generated grid and writes it to the file (or
     to the screen, if that's what we want). The grid is expected to be a list
     of lists, as used by the remaining functions.
@@ -31,130 +106,414 @@ def write_grid_to_file(grid, out_file="table.tex", out_pdf="out.pdf", keep_tex=F
     If a list of words is given, it is taken as the words used on the grid and
     is printed as such.
     """
-    # Print grid to the file and compile
-    with open(out_file, "w") as texfile:
-        # Write preamble
-        texfile.write("\documentclass[a4paper]{article}" + "\n")
-        texfile.write(r"\usepackage[utf8]{inputenc}" + "\n")
-        texfile.write(r"\usepackage[table]{xcolor}" + "\n")
-        texfile.write(r"\usepackage{multicol}" + "\n")
-        texfile.write(r"\usepackage{fullpage}" + "\n")
-        texfile.write(r"\usepackage{graphicx}" + "\n")
-        texfile.write("\n")
-        texfile.write(r"\begin{document}" + "\n")
-        texfile.write(r"\section*{Challenge}" + "\n")
-
-        # Resize box
-        texfile.write(r"\resizebox{\textwidth}{!}{")
-
-        # Write table environment and format
-        texfile.write(r"\begin{tabular}{|")
-        for i in range(len(grid[0])):
-            texfile.write(r"c|")
-        texfile.write("}\n\hline\n")
-
-        # Write actual table
-        for line in grid:
-            for index, element in enumerate(line):
-                if element == 0:
-                    texfile.write(r"\cellcolor{black}0")
-
-                # This feels a bit hacky, suggestions appreciated
-                if index != len(line)-1:
-                    texfile.write(" & ")
-
-            texfile.write(r"\\ \hline" + "\n")
-
-        # End tabular environment
-        texfile.write("\end{tabular}\n")
-        texfile.write(r"}" + "\n\n")
-
-        # Write the words that were used
-        if words:
-            texfile.write(r"\section*{Words used for the problem}" + "\n")
-            # Write in several columns
-            texfile.write(r"\begin{multicols}{4}" + "\n")
-            texfile.write(r"\noindent" + "\n")
-            # Sort words by size
-            words.sort(key=lambda word: (len(word), word[0]))
-            # Write words
-            for word in words:
-                texfile.write(word + r"\\" + "\n")
-            # End multicolumn environment
-            texfile.write(r"\end{multicols}" + "\n")
-
-        # Page break and new section
-        texfile.write(r"\newpage" + "\n")
-        texfile.write(r"\section*{Solution}" + "\n")
-
-        # Write solution
-        # Resize box
-        texfile.write(r"\resizebox{\textwidth}{!}{")
-
-        # Write table environment and format
-        texfile.write(r"\begin{tabular}{|")
-        for i in range(len(grid[0])):
-            texfile.write(r"c|")
-        texfile.write("}\n\hline\n")
-
-        # Write actual table
-        for line in grid:
-            for index, element in enumerate(line):
-                if element == 0:
-                    texfile.write(r"\cellcolor{black}0")
-                else:
-                    texfile.write(str(element))
-                # This feels a bit hacky, suggestions appreciated
-                if index != len(line)-1:
-                    texfile.write(" & ")
-
-            texfile.write(r"\\ \hline" + "\n")
-
-        # End tabular environment
-        texfile.write("\end{tabular}\n")
-        texfile.write(r"}")
-
-        # End document
-        texfile.write("\end{document}\n")
+    write_grids_to_file([(grid, words)], out_file, out_pdf, keep_tex, compiler)
+
+
+def write_grids_to_file(puzzles, out_file="table.tex", out_pdf="out.pdf", keep_tex=False, compiler="pdflatex"):
+    """ Writes several puzzles to a single PDF.
+
+    Each puzzle is a (grid, words) tuple, as taken by write_grid_to_file. The
+    latex source is only written to out_file if keep_tex is set.
+    """
+    print("\n=== Compiling the generated latex file! ===")
+    compile_latex(make_latex_document(puzzles), out_pdf, compiler, out_file if keep_tex else None)
+    print("=== Done! ===\n")
+
+
+def make_latex_document(puzzles):
+    """ Builds the latex source for the given puzzles, in memory, and returns it as a string.
+
+    Each puzzle is a (grid, words) tuple, as taken by write_grid_to_file.
+    """
+    texfile = io.StringIO()
+
+    # Write preamble
+    texfile.write("\documentclass[a4paper]{article}" + "\n")
+    texfile.write(r"\usepackage[utf8]{inputenc}" + "\n")
+    texfile.write(r"\usepackage[table]{xcolor}" + "\n")
+    texfile.write(r"\usepackage{multicol}" + "\n")
+    texfile.write(r"\usepackage{fullpage}" + "\n")
+    texfile.write(r"\usepackage{graphicx}" + "\n")
+    texfile.write("\n")
+    texfile.write(r"\begin{document}" + "\n")
+
+    # Write each puzzle on its own pages
+    for index, (grid, words) in enumerate(puzzles):
+        if index > 0:
+            texfile.write("\n" + r"\newpage" + "\n")
+        write_puzzle(texfile, grid, words)
+
+    # End document
+    texfile.write("\end{document}\n")
+
+    return texfile.getvalue()
+
+
+def compile_latex(tex, out_pdf, compiler="pdflatex", out_file=None):
+    """ Compiles the given latex source into out_pdf.
+
+    The compiler runs in a temporary folder, without changing the working
+    directory of the process, so that several compilations can run at once.
+    If out_file is given, the latex source is also written there.
+
+    The "stub" compiler does not run latex at all, and just writes the latex
+    source to out_pdf, so that the rest of the pipeline can run without TeX.
+    """
+    out_pdf = os.path.abspath(out_pdf)
+
+    if out_file:
+        with open(out_file, "w") as texfile:
+            texfile.write(tex)
+
+    if compiler == "stub":
+        with open(out_pdf, "w") as pdffile:
+            pdffile.write(tex)
+        return
 
     # Compile in a temp folder
     # (inspired by https://stackoverflow.com/questions/19683123/compile-latex-from-python)
-    print("\n=== Compiling the generated latex file! ===")
     with tempfile.TemporaryDirectory() as tmpdir:
-        # Save current directory
-        original_dir = os.getcwd()
+        with open(os.path.join(tmpdir, "out.tex"), "w") as texfile:
+            texfile.write(tex)
 
-        # Copy the latex source to the temporary directory
-        shutil.copy(out_file, tmpdir)
+        # Compile, and only show latex's output if something goes wrong
+        proc = subprocess.run([compiler, "-interaction=nonstopmode", "out.tex"], cwd=tmpdir,
+                              stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        if proc.returncode != 0:
+            print(proc.stdout.decode(errors="replace"))
 
-        # Move to the temp directory
-        os.chdir(tmpdir)
+        # Copy PDF back to where it was asked for
+        shutil.copy(os.path.join(tmpdir, "out.pdf"), out_pdf)
 
-        # Rename .tex file to generic name "out"
-        os.rename(out_file, "out.tex")
 
-        # Compile
-        proc = subprocess.call(['pdflatex', "out.tex"])
+class RenderQueue:
+    """ Compiles PDFs in the background, so that generation can go on in the meantime.
 
-        # Copy PDF back to the original directory
-        shutil.copy("out.pdf", original_dir+"/"+out_pdf)
+    Documents are compiled by a pool of worker threads (each compilation runs
+    in its own process anyway). The queue is bounded: once max_pending
+    documents are waiting or compiling, submit blocks until one is done.
+    """
+    def __init__(self, n_workers=2, max_pending=8, compiler="pdflatex"):
+        self.executor = concurrent.futures.ThreadPoolExecutor(n_workers)
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.compiler = compiler
+        self.futures = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def submit(self, puzzles, out_pdf):
+        """ Queues the given puzzles to be compiled into out_pdf.
+
+        The latex source is built right away, so the puzzles can be reused as
+        soon as this returns.
+        """
+        tex = make_latex_document(puzzles)
+        self.slots.acquire()
+        try:
+            future = self.executor.submit(compile_latex, tex, out_pdf, self.compiler)
+        except Exception:
+            self.slots.release()
+            raise
+        future.add_done_callback(lambda _: self.slots.release())
+        self.futures.append(future)
+        return future
+
+    def close(self):
+        """ Waits for every queued document, and raises the first error found, if any.
+        """
+        self.executor.shutdown(wait=True)
+        for future in self.futures:
+            future.result()
+
+
+def write_puzzle(texfile, grid, words):
+    """ Writes the challenge and solution for a single puzzle to an open latex file.
+    """
+    texfile.write(r"\section*{Challenge}" + "\n")
 
-        # Move back to the original directory
-        os.chdir(original_dir)
-    print("=== Done! ===\n")
+    # Resize box
+    texfile.write(r"\resizebox{\textwidth}{!}{")
 
-    # Remove tex file?
-    if not keep_tex:
-        os.remove(out_file)
+    # Write table environment and format
+    texfile.write(r"\begin{tabular}{|")
+    for i in range(len(grid[0])):
+        texfile.write(r"c|")
+    texfile.write("}\n\hline\n")
+
+    # Write actual table
+    for line in grid:
+        for index, element in enumerate(line):
+            if element == 0 or element == BLOCK:
+                texfile.write(r"\cellcolor{black}0")
+
+            # This feels a bit hacky, suggestions appreciated
+            if index != len(line)-1:
+                texfile.write(" & ")
+
+        texfile.write(r"\\ \hline" + "\n")
+
+    # End tabular environment
+    texfile.write("\end{tabular}\n")
+    texfile.write(r"}" + "\n\n")
+
+    # Write the words that were used
+    if words:
+        texfile.write(r"\section*{Words used for the problem}" + "\n")
+        # Write in several columns
+        texfile.write(r"\begin{multicols}{4}" + "\n")
+        texfile.write(r"\noindent" + "\n")
+        # Sort words by size
+        words.sort(key=lambda word: (len(word), word[0]))
+        # Write words
+        for word in words:
+            texfile.write(word + r"\\" + "\n")
+        # End multicolumn environment
+        texfile.write(r"\end{multicols}" + "\n")
+
+    # Page break and new section
+    texfile.write(r"\newpage" + "\n")
+    texfile.write(r"\section*{Solution}" + "\n")
+
+    # Write solution
+    # Resize box
+    texfile.write(r"\resizebox{\textwidth}{!}{")
+
+    # Write table environment and format
+    texfile.write(r"\begin{tabular}{|")
+    for i in range(len(grid[0])):
+        texfile.write(r"c|")
+    texfile.write("}\n\hline\n")
+
+    # Write actual table
+    for line in grid:
+        for index, element in enumerate(line):
+            if element == 0 or element == BLOCK:
+                texfile.write(r"\cellcolor{black}0")
+            else:
+                texfile.write(str(element))
+            # This feels a bit hacky, suggestions appreciated
+            if index != len(line)-1:
+                texfile.write(" & ")
+
+        texfile.write(r"\\ \hline" + "\n")
+
+    # End tabular environment
+    texfile.write("\end{tabular}\n")
+    texfile.write(r"}")
 
 
 def write_grid_to_screen(grid, words_in_grid):
-    # Print grid to the screen
+    # Print grid to the screen, a line at a time
     print("Final grid:")
     for line in grid:
-        for element in line:
-            print(" {}".format(element), end="")
-        print()
+        print("".join(" {}".format(element) for element in line))
 
     print("Words:")
-    pprint.pprint(words_in_grid)
\ No newline at end of file
+    pprint.pprint(words_in_grid)
+
+
+def grid_to_dict(grid, words_in_grid):
+    """ Converts a grid and the words in it to a dictionary that can be written as JSON.
+
+    Each line of the grid becomes a string, where empty cells are written as ".".
+    """
+    return {"dimensions": [len(grid), len(grid[0])],
+            "grid": ["".join("." if element == 0 else element for element in line) for line in grid],
+            "words_in_grid": words_in_grid}
+
+
+def write_grid_to_jsonl(jsonl_file, grid, words_in_grid, **fields):
+    """ Writes a grid as a single line of JSON to an open file, and flushes it
+    so that readers see each grid as soon as it is written.
+
+    Any extra fields given are added to the JSON object.
+    """
+    record = grid_to_dict(grid, words_in_grid)
+    record.update(fields)
+    jsonl_file.write(json.dumps(record) + "\n")
+    jsonl_file.flush()
+
+
+def is_letter(element):
+    """ Checks whether a cell of a grid (as returned by iterating over it) holds a letter.
+    """
+    return element != 0 and element != BLOCK
+
+
+def upper_letter(letter):
+    """ Returns the upper case of a letter, unless it is not a single latin1
+    character (e.g. "ß" becomes "SS"), in which case the letter is kept as it is.
+    """
+    upper = letter.upper()
+    if len(upper) != 1 or ord(upper) > 0xff:
+        return letter
+    return upper
+
+
+def number_grid(rows):
+    """ Numbers the entries of a grid the way printed crosswords do.
+
+    rows is a list of lists of cells (as returned by iterating over a grid).
+    Cells are numbered in reading order, whenever an across or down entry (a
+    run of at least two letters) starts there.
+
+    Returns a list of (number, line, column, across_length, down_length)
+    tuples, where a length is 0 if no entry starts there in that direction.
+    """
+    height = len(rows)
+    width = len(rows[0]) if rows else 0
+    numbers = []
+
+    for line in range(height):
+        for column in range(width):
+            if not is_letter(rows[line][column]):
+                continue
+
+            across = down = 0
+            if column == 0 or not is_letter(rows[line][column-1]):
+                while column+across < width and is_letter(rows[line][column+across]):
+                    across += 1
+            if line == 0 or not is_letter(rows[line-1][column]):
+                while line+down < height and is_letter(rows[line+down][column]):
+                    down += 1
+
+            across = across if across > 1 else 0
+            down = down if down > 1 else 0
+            if across or down:
+                numbers.append((len(numbers)+1, line, column, across, down))
+
+    return numbers
+
+
+def write_grid_as_json(out, grid, words_in_grid, **fields):
+    """ Writes a grid as a JSON object to a text file object (see grid_to_dict).
+
+    Any extra fields given are added to the JSON object.
+    """
+    record = grid_to_dict(grid, words_in_grid)
+    record.update(fields)
+    json.dump(record, out)
+    out.write("\n")
+
+
+def puz_checksum(data, checksum=0):
+    """ Computes the checksum of a region of an Across Lite file, starting from the given one.
+    """
+    for byte in data:
+        checksum = (checksum >> 1) | ((checksum & 1) << 15)
+        checksum = (checksum + byte) & 0xffff
+    return checksum
+
+
+def write_grid_as_puz(out, grid, words_in_grid, title="Crossword", author="", copyright=""):
+    """ Writes a grid as an Across Lite (.puz) file, to a binary file object.
+
+    Empty cells are black. The puzzle has no clues (see the readme), so each
+    entry is clued with its length, e.g. "(5)". Text is written in latin1,
+    which is what the format uses.
+
+    Raises ValueError if the grid is larger than 255x255 cells, which the
+    format cannot hold.
+    """
+    rows = list(grid)
+    height = len(rows)
+    width = len(rows[0])
+    if width > 255 or height > 255:
+        raise ValueError("a {}x{} grid does not fit in an Across Lite file".format(height, width))
+
+    solution = "".join(upper_letter(element) if is_letter(element) else "." for line in rows for element in line).encode("latin1")
+    fill = bytes(b"-"[0] if byte != b"."[0] else byte for byte in solution)
+
+    # Across clues come before down clues of the same number
+    clues = []
+    for number, line, column, across, down in number_grid(rows):
+        if across:
+            clues.append("({})".format(across))
+        if down:
+            clues.append("({})".format(down))
+
+    title, author, copyright = (x.encode("latin1") for x in (title, author, copyright))
+    clues = [clue.encode("latin1") for clue in clues]
+
+    # Strings are checksummed with their terminators, but for the clues
+    def strings_checksum(checksum):
+        for text in (title, author, copyright):
+            if text:
+                checksum = puz_checksum(text + b"\0", checksum)
+        for clue in clues:
+            checksum = puz_checksum(clue, checksum)
+        return checksum
+
+    puzzle_info = bytes([width, height]) + len(clues).to_bytes(2, "little") + (1).to_bytes(2, "little") + (0).to_bytes(2, "little")
+    info_checksum = puz_checksum(puzzle_info)
+    checksum = strings_checksum(puz_checksum(fill, puz_checksum(solution, info_checksum)))
+
+    # The "masked" checksums xor each partial checksum with "ICHEATED"
+    partial = [info_checksum, puz_checksum(solution), puz_checksum(fill), strings_checksum(0)]
+    masked = bytes(ord(mask) ^ (value & 0xff) for mask, value in zip("ICHE", partial))
+    masked += bytes(ord(mask) ^ (value >> 8) for mask, value in zip("ATED", partial))
+
+    out.write(checksum.to_bytes(2, "little"))
+    out.write(b"ACROSS&DOWN\0")
+    out.write(info_checksum.to_bytes(2, "little"))
+    out.write(masked)
+    out.write(b"1.3\0")
+    out.write(bytes(2))
+    out.write(bytes(2))
+    out.write(bytes(12))
+    out.write(puzzle_info)
+    out.write(solution)
+    out.write(fill)
+    for text in [title, author, copyright] + clues + [b""]:
+        out.write(text + b"\0")
+
+
+def write_grid_as_svg(out, grid, words_in_grid, cell_size=30, solution=True):
+    """ Writes a grid as a standalone SVG image, to a text file object.
+
+    Empty cells are black, and the cells where entries start are numbered
+    (see number_grid). Letters are only drawn if solution is True.
+    """
+    rows = list(grid)
+    height = len(rows)
+    width = len(rows[0])
+    numbers = {(line, column): number for number, line, column, _, _ in number_grid(rows)}
+
+    out.write('<svg xmlns="http://www.w3.org/2000/svg" width="{0}" height="{1}" viewBox="-1 -1 {0} {1}">\n'.format(
+        width*cell_size + 2, height*cell_size + 2))
+    out.write('<style>rect{{stroke:#000;stroke-width:1}} .n{{font:{}px sans-serif}} .l{{font:{}px sans-serif;text-anchor:middle}}</style>\n'.format(
+        cell_size*3//10, cell_size*6//10))
+
+    for line, row in enumerate(rows):
+        y = line*cell_size
+        for column, element in enumerate(row):
+            x = column*cell_size
+            if not is_letter(element):
+                out.write('<rect x="{}" y="{}" width="{}" height="{}" fill="#000"/>\n'.format(x, y, cell_size, cell_size))
+                continue
+
+            out.write('<rect x="{}" y="{}" width="{}" height="{}" fill="#fff"/>\n'.format(x, y, cell_size, cell_size))
+            if (line, column) in numbers:
+                out.write('<text class="n" x="{}" y="{}">{}</text>\n'.format(x + 2, y + cell_size*3//10, numbers[(line, column)]))
+            if solution:
+                out.write('<text class="l" x="{}" y="{}">{}</text>\n'.format(x + cell_size//2, y + cell_size*8//10, xml.sax.saxutils.escape(upper_letter(element))))
+
+    out.write("</svg>\n")
+
+
+# Writers of each export format, and the mode to open their files with
+export_formats = {"json": (write_grid_as_json, "w"),
+                  "puz": (write_grid_as_puz, "wb"),
+                  "svg": (write_grid_as_svg, "w")}
+
+
+def export_grid(grid, words_in_grid, export_format, filename):
+    """ Writes a grid to a file, in one of the export formats (see export_formats).
+    """
+    writer, mode = export_formats[export_format]
+    with open(filename, mode) as out:
+        writer(out, grid, words_in_grid)
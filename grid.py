@@ -0,0 +1,238 @@
+# Cells that can never hold a letter, as written in templates and returned by get
+BLOCK = "#"
+BLOCK_CODE = ord(BLOCK)
+
+
+class Grid:
+    """ A crossword grid, stored as a flat bytearray.
+
+    Empty cells hold 0 and filled cells hold the (latin1) code of their letter.
+    Cell values are read with get(), which returns 0 for empty cells and the
+    letter otherwise, just like the old list-of-lists grids did.
+
+    The grid keeps running counters of how many cells are filled, in total and
+    per line and column, so that occupancy is always known without a rescan.
+    It also counts how many words use each cell, so that words can be removed
+    without disturbing the words that cross them.
+
+    Cells can also be blocked (see add_template). Blocked cells hold BLOCK,
+    never get a letter, and do not count towards the occupancy.
+
+    Every line and column also has a version, which changes whenever one of
+    its cells does, so that what was read from it can be cached until then.
+    This keeps the work of adding a word to the lines and columns it touches,
+    however large the grid.
+    """
+    def __init__(self, dimensions):
+        """ dimensions[0] -> lines
+        dimensions[1] -> columns
+        """
+        self.height = dimensions[0]
+        self.width = dimensions[1]
+        self.cells = bytearray(self.height*self.width)
+        self.uses = bytearray(self.height*self.width)
+        self.filled = 0
+        self.blocked = 0
+        self.line_filled = [0]*self.height
+        self.column_filled = [0]*self.width
+        self.line_version = [0]*self.height
+        self.column_version = [0]*self.width
+        self.fragments = [None]*(2*self.height*self.width)
+        self.history = []
+
+        # The open slots of each line and column (see basic_ops.find_open_slots)
+        self.line_slots = [None]*self.height
+        self.column_slots = [None]*self.width
+
+    def __getstate__(self):
+        # Caches are cheap to rebuild, so they are not sent along
+        state = self.__dict__.copy()
+        state["fragments"] = [None]*len(self.fragments)
+        state["line_slots"] = [None]*self.height
+        state["column_slots"] = [None]*self.width
+        return state
+
+    def __len__(self):
+        return self.height
+
+    def __getitem__(self, line):
+        """ Returns a copy of the given line, as a list.
+        """
+        return [self.get(line, column) for column in range(self.width)]
+
+    def __iter__(self):
+        for line in range(self.height):
+            yield self[line]
+
+    def get(self, line, column):
+        """ Returns the letter in the given cell, or 0 if it is empty.
+        """
+        value = self.cells[line*self.width + column]
+        return chr(value) if value else 0
+
+    def is_free(self, line, column):
+        """ Checks whether a cell is free, i.e. has no letter in it. Cells out of
+        bounds and blocked cells are free.
+        """
+        if line < 0 or column < 0 or line >= self.height or column >= self.width:
+            return True
+        value = self.cells[line*self.width + column]
+        return value == 0 or value == BLOCK_CODE
+
+    def is_blocked(self, line, column):
+        """ Checks whether a cell is blocked. Cells out of bounds are not.
+        """
+        if line < 0 or column < 0 or line >= self.height or column >= self.width:
+            return False
+        return self.cells[line*self.width + column] == BLOCK_CODE
+
+    def occupancy(self):
+        """ Returns the share of the cells that can hold a letter which do.
+        """
+        return self.filled / (self.height*self.width - self.blocked)
+
+    def add_template(self, rows):
+        """ Writes the letters of a template into the grid.
+
+        The template is a list of strings, one per line, where "." marks an
+        empty cell and BLOCK a blocked one. Template letters count as one more
+        use of their cells, so they stay in the grid even if every word over
+        them is removed.
+
+        Raises ValueError if the template does not have the grid's dimensions.
+        """
+        if len(rows) != self.height or any(len(row) != self.width for row in rows):
+            raise ValueError("template does not fit a {}x{} grid".format(self.height, self.width))
+
+        for line, row in enumerate(rows):
+            for column, letter in enumerate(row):
+                if letter == ".":
+                    continue
+                cell = line*self.width + column
+                if letter == BLOCK:
+                    if self.cells[cell] != BLOCK_CODE:
+                        self.cells[cell] = BLOCK_CODE
+                        self.blocked += 1
+                        self.line_version[line] += 1
+                        self.column_version[column] += 1
+                    continue
+                if self.uses[cell] == 0:
+                    self.cells[cell] = ord(letter)
+                    self.filled += 1
+                    self.line_filled[line] += 1
+                    self.column_filled[column] += 1
+                    self.line_version[line] += 1
+                    self.column_version[column] += 1
+                self.uses[cell] += 1
+
+    def fragment_around(self, line, column, direction):
+        """ Returns the letters that a letter put in the given cell would join,
+        in the given direction ("E" along the line, "S" along the column).
+
+        Returns a (start, before, after) tuple, where before and after are the
+        letters up to the first free cell before and after the given one, and
+        start is the line (or column) where they begin.
+
+        Fragments are read in a single pass, and kept (one per cell and
+        direction, so the cache never outgrows the grid) until their line (or
+        column) changes.
+        """
+        cell = line*self.width + column
+        if direction == "E":
+            key, version = 2*cell, self.line_version[line]
+        else:
+            key, version = 2*cell + 1, self.column_version[column]
+
+        cached = self.fragments[key]
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        # Walk to both ends of the run of letters, and slice it out at once
+        if direction == "E":
+            step, first, last = 1, line*self.width, (line+1)*self.width
+        else:
+            step, first, last = self.width, column, len(self.cells)
+        begin = cell
+        while begin - step >= first and self.cells[begin - step] not in (0, BLOCK_CODE):
+            begin -= step
+        end = cell + step
+        while end < last and self.cells[end] not in (0, BLOCK_CODE):
+            end += step
+
+        before = self.cells[begin:cell:step].decode("latin1")
+        after = self.cells[cell+step:end:step].decode("latin1")
+        fragment = (column - len(before) if direction == "E" else line - len(before), before, after)
+
+        self.fragments[key] = (version, fragment)
+        return fragment
+
+    def word_cells(self, possibility):
+        """ Returns the flat indices of the cells covered by the given possibility.
+        """
+        line, column = possibility["location"]
+        start = line*self.width + column
+        step = 1 if possibility["D"] == "E" else self.width
+        return range(start, start + step*len(possibility["word"]), step)
+
+    def add_word(self, possibility):
+        """ Writes a word into the grid.
+        """
+        for cell, letter in zip(self.word_cells(possibility), possibility["word"]):
+            if self.uses[cell] == 0:
+                self.cells[cell] = ord(letter)
+                self.filled += 1
+                self.line_filled[cell // self.width] += 1
+                self.column_filled[cell % self.width] += 1
+                self.line_version[cell // self.width] += 1
+                self.column_version[cell % self.width] += 1
+            self.uses[cell] += 1
+
+    def remove_word(self, possibility):
+        """ Removes a word from the grid, and from the placement that put it
+        there (see place), so that undoing that placement leaves it out.
+
+        Cells that are still used by other words keep their letters.
+        """
+        for k in range(len(self.history)-1, -1, -1):
+            if possibility in self.history[k]:
+                self.history[k].remove(possibility)
+                if not self.history[k]:
+                    del self.history[k]
+                break
+        self.erase_word(possibility)
+
+    def erase_word(self, possibility):
+        """ Takes the letters of a word out of the grid, leaving those of the
+        cells still used by other words.
+        """
+        for cell in self.word_cells(possibility):
+            self.uses[cell] -= 1
+            if self.uses[cell] == 0:
+                self.cells[cell] = 0
+                self.filled -= 1
+                self.line_filled[cell // self.width] -= 1
+                self.column_filled[cell % self.width] -= 1
+                self.line_version[cell // self.width] += 1
+                self.column_version[cell % self.width] += 1
+
+    def place(self, possibility, new_words=()):
+        """ Adds a word to the grid, along with any new words it creates.
+
+        The placement is recorded so that it can be undone, until its words
+        are removed.
+        """
+        self.add_word(possibility)
+        for word in new_words:
+            self.add_word(word)
+        self.history.append([possibility] + list(new_words))
+
+    def undo(self):
+        """ Removes the last placement (or what is left of it, see remove_word)
+        from the grid, and returns its first word, or None if there is none.
+        """
+        if not self.history:
+            return None
+        placement = self.history.pop()
+        for word in placement:
+            self.erase_word(word)
+        return placement[0]
@@ -1,13 +1,33 @@
+import base64
+import random
+import time
+
 import basic_ops
+from progress import EventSource
+from word_graph import WordGraph
+from word_index import WordIndex
+from word_sampler import WordSampler
+from word_store import WordStore
 
 
-class GridGenerator:
-    def __init__(self, word_list, dimensions, n_loops, timeout, target_occupancy):
-        self.word_list = word_list
+class GridGenerator(EventSource):
+    def __init__(self, word_list, dimensions, n_loops, timeout, target_occupancy, stop_condition=None, seed=None, word_index=None, top_k=None,
+                 keep_largest_component=False, profile=None, template=None):
         self.dimensions = dimensions
         self.n_loops = n_loops
         self.timeout = timeout
         self.target_occupancy = target_occupancy
+        self.init_events(stop_condition)
+        self.top_k = top_k
+        self.keep_largest_component = keep_largest_component
+        self.profile = profile
+        self.template = template
+        self.rng = random.Random()
+        self.set_seed(seed)
+        # Every word of a given index is available, unless a word list is given too
+        self.word_index = word_index if word_index is not None else WordIndex(word_list)
+        self.word_list = WordStore(self.word_index, word_list if word_index is not None else None)
+        self.word_sampler = WordSampler(self.word_index, self.word_list)
         self.reset()
 
     def get_grid(self):
@@ -16,53 +36,193 @@ class GridGenerator:
     def get_words_in_grid(self):
         return self.words_in_grid
 
-    def generate_grid(self):
+    def set_seed(self, seed=None):
+        """ Seeds the generator's random number generator.
+
+        Every random choice the search makes comes from this generator, so
+        two searches with the same seed (and word list) make the same choices.
+        If no seed is given, a random one is picked, so that the search can
+        still be replayed later.
+        """
+        self.seed = seed if seed is not None else random.randrange(2**32)
+        self.rng.seed(self.seed)
+
+    def get_stats(self):
+        """ Returns the statistics of the last search: the number of candidates
+        tried, and the occupancy of the grid over time, as [time, occupancy] points.
+        """
+        return self.stats
+
+    def generate_grid(self, resume=False):
         """ Updates the internal grid with content.
 
         This is the main outward-facing function
+
+        The grid starts out empty (or with the letters of the template, if
+        there is one), unless resume is True, in which case the search goes on
+        from the current grid, e.g. one restored with set_state.
+
+        The whole generation must end by a single deadline, timeout seconds
+        per loop from now. Each loop gets an even share of the time that is
+        left, so time that a loop leaves unused (because its fill stalled)
+        goes to the next ones. Loops stop early once one of them does not
+        make the grid any fuller.
         """
-        self.reset()
-        print("Generating {} grid with {} words.".format(self.dimensions, len(self.word_list)))
+        if resume:
+            self.stop_requested = False
+            self.start_time = time.monotonic()
+        else:
+            self.reset()
+        self.emit("start", dimensions=self.dimensions, words=len(self.word_list), seed=self.seed)
+        deadline = time.monotonic() + self.timeout*self.n_loops
+        occupancy = self.grid.occupancy()
 
         # Fill it up with the recommended number of loops
         for i in range(self.n_loops):
-            print("Starting execution loop {}:".format(i+1))
-            self.generate_content_for_grid()
-
-            print("Culling isolated words.")
+            if self.should_stop():
+                break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+
+            self.emit("loop", loop=i+1)
+            self.generate_content_for_grid(remaining / (self.n_loops - i))
             self.cull_isolated_words()
-            self.reset_grid_to_existing_words()
 
-        print("Built a grid of occupancy {}.".format(basic_ops.compute_occupancy(self.grid)))
+            # Stop when the grid is full enough, or no longer getting fuller
+            previous_occupancy, occupancy = occupancy, self.grid.occupancy()
+            if occupancy >= self.target_occupancy or occupancy <= previous_occupancy:
+                break
+
+        self.emit("done")
 
     def reset(self):
+        """ Starts over with an empty grid, with every word available again.
+
+        If there is a template, its letters are written into the grid, and
+        the words they form are kept for good.
+        """
+        self.clear_grid()
+        self.word_list.restore()
+        self.stats = {"tries": 0, "occupancy_curve": []}
+        self.stop_requested = False
+        self.start_time = time.monotonic()
+
+        for word in self.template_words:
+            self.place_existing_word(word)
+            if word["word"] in self.word_list:
+                self.word_list.remove(word["word"])
+
+    def clear_grid(self):
+        """ Replaces the grid with an empty one (but for the template letters).
+        """
         self.grid = basic_ops.create_empty_grid(self.dimensions)
         self.words_in_grid = []
+        self.word_graph = WordGraph(self.grid)
+        self.template_words = []
 
-    def generate_content_for_grid(self):
-        """ Uses the basic fill algorithm to fill up the crossword grid.
+        if self.template is not None:
+            self.grid.add_template(self.template)
+            self.template_words = basic_ops.find_template_words(self.template)
+
+    def place_existing_word(self, word):
+        """ Puts a word back in the grid, without any checks.
         """
-        self.words_in_grid += basic_ops.basic_grid_fill(self.grid, self.target_occupancy, self.timeout, self.dimensions, self.word_list)
+        self.grid.add_word(word)
+        self.word_graph.add(word)
+        self.words_in_grid.append(word)
 
-    def cull_isolated_words(self):
-        """ Removes words that are too isolated from the grid
+    def get_state(self):
+        """ Returns the state of the search, in a form that can be written as
+        JSON, so that it can be continued later (see set_state).
 
-        TODO: does not seem to work correctly yet.
+        The state holds the grid, the words in it, the words that were used
+        and the state of the random number generator.
+        """
+        rng_state = self.rng.getstate()
+        return {"dimensions": list(self.dimensions),
+                "seed": self.seed,
+                "template": self.template,
+                "grid": base64.b64encode(bytes(self.grid.cells)).decode("ascii"),
+                "words_in_grid": self.words_in_grid,
+                "word_list": self.word_list.get_state(),
+                "rng_state": [rng_state[0], list(rng_state[1]), rng_state[2]],
+                "tries": self.stats["tries"]}
+
+    def set_state(self, state):
+        """ Restores a state returned by get_state, from a generator built with
+        the same word list.
+
+        Call generate_grid(resume=True) to continue the search from it.
+
+        Raises ValueError if the state does not fit this generator.
         """
-        isolated_words = []
+        if list(state["dimensions"]) != list(self.dimensions):
+            raise ValueError("state is for a {} grid, not {}".format(state["dimensions"], self.dimensions))
+
+        self.template = state["template"]
+        self.seed = state["seed"]
+        self.clear_grid()
+        for word in state["words_in_grid"]:
+            self.place_existing_word(word)
+        if bytes(self.grid.cells) != base64.b64decode(state["grid"]):
+            raise ValueError("state grid does not match its words")
+
+        self.word_list.set_state(state["word_list"])
+        version, internal_state, gauss = state["rng_state"]
+        self.rng.setstate((version, tuple(internal_state), gauss))
+        self.stats = {"tries": state["tries"], "occupancy_curve": []}
+
+    def generate_content_for_grid(self, timeout=None):
+        """ Uses the basic fill algorithm to fill up the crossword grid, for
+        the given time (or the time of a loop).
+
+        Words are recorded as soon as each one is placed, before the "word"
+        event goes out, so that the state saved by a subscriber (see
+        progress.Checkpointer) always matches the grid.
+        """
+        basic_ops.basic_grid_fill(self.grid, self.target_occupancy, timeout if timeout is not None else self.timeout, self.dimensions, self.word_list, self.word_index, self.should_stop, self.stats, self.rng, self.top_k,
+                                  self.record_and_emit, self.profile, sampler=self.word_sampler)
 
-        for word in self.words_in_grid:
-            if basic_ops.is_isolated(word, self.grid):
-                print("Culling word: {}.".format(word))
-                isolated_words.append(word)
+    def record_and_emit(self, event_type, **fields):
+        """ Records the words placed by the fill, then passes its events on to the subscribers.
+        """
+        if event_type == "word":
+            for word in [fields["word"]] + list(fields["new_words"]):
+                self.words_in_grid.append(word)
+                self.word_graph.add(word)
+            if self.profile is not None:
+                self.profile.lap("word_graph")
+        self.emit(event_type, **fields)
 
-        for word in isolated_words:
-            self.words_in_grid.remove(word)
+    def cull_isolated_words(self):
+        """ Removes words that do not cross any other word from the grid.
 
-    def reset_grid_to_existing_words(self):
-        """ Resets the stored grid to the words in self.words_in_grid
+        If only the largest connected component is to be kept, every word
+        outside of it is removed instead. Removed words can be used again.
         """
-        self.grid = basic_ops.create_empty_grid(self.dimensions)
-
-        for word in self.words_in_grid:
-            basic_ops.add_word_to_grid(word, self.grid)
+        if self.profile is not None:
+            self.profile.start()
+        if self.keep_largest_component:
+            culled_words = self.word_graph.words_outside_largest_component()
+        else:
+            culled_words = self.word_graph.isolated_words()
+
+        # Template words are there to stay
+        culled_words = [word for word in culled_words if word not in self.template_words]
+        if not culled_words:
+            return
+        # Culled words go back to the word list in the same order on every run
+        culled_words.sort(key=WordGraph.key)
+
+        # Take them out of the grid, leaving the remaining words untouched
+        for word in culled_words:
+            self.emit("cull", word=word)
+            self.grid.remove_word(word)
+            self.word_graph.remove(word)
+            self.word_list.add(word["word"])
+
+        self.words_in_grid = [word for word in self.words_in_grid if word in self.word_graph]
+        if self.profile is not None:
+            self.profile.lap("cull")
+            self.profile.count("culled_words", len(culled_words))
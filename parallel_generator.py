@@ -0,0 +1,109 @@
+import multiprocessing
+import random
+import time
+
+import basic_ops
+import worker_pool
+from progress import EventSource
+from worker_pool import worker_state
+
+
+def setup_worker(generator_class, generator_args, generator_kwargs, deadline, stop_event):
+    """ Sets up a worker process of the pool (see worker_pool.init_worker).
+    """
+    return {"generator_class": generator_class,
+            "generator_args": generator_args,
+            "generator_kwargs": generator_kwargs,
+            "deadline": deadline,
+            "stop_event": stop_event}
+
+
+def run_search(seed):
+    """ Runs a single search in a worker process, and returns its results.
+    """
+    deadline = worker_state["deadline"]
+    stop_event = worker_state["stop_event"]
+
+    def should_stop():
+        return stop_event.is_set() or time.monotonic() > deadline
+
+    generator_kwargs = dict(worker_state["generator_kwargs"])
+    generator_kwargs["profile"] = worker_pool.task_profile(generator_kwargs.get("profile"))
+
+    generator = worker_state["generator_class"](*worker_state["generator_args"], stop_condition=should_stop, seed=seed, **generator_kwargs)
+    generator.generate_grid()
+    grid = generator.get_grid()
+
+    # Reaching the target means the other workers can stop
+    if grid.occupancy() >= generator.target_occupancy:
+        stop_event.set()
+
+    return seed, grid, generator.get_words_in_grid(), generator_kwargs.get("profile")
+
+
+class ParallelGenerator(EventSource):
+    """ Runs several independent searches in a process pool, and keeps the best grid.
+
+    Each search runs its own generator (of the given class), with a seed
+    derived from the given one, so that searches draw independent random
+    streams and any of them can be replayed on its own. All searches share
+    the same deadline, and they all stop as soon as one of them reaches the
+    target occupancy.
+
+    Any other keyword arguments are passed on to every generator. If a
+    profiler is among them, it gets the sum of every search's counts and times.
+    """
+    def __init__(self, generator_class, n_jobs, word_list, dimensions, n_loops, timeout, target_occupancy, seed=None, **generator_kwargs):
+        self.generator_class = generator_class
+        self.n_jobs = n_jobs
+        self.word_list = word_list
+        self.dimensions = dimensions
+        self.n_loops = n_loops
+        self.timeout = timeout
+        self.target_occupancy = target_occupancy
+        self.seed = seed if seed is not None else random.randrange(2**32)
+        self.generator_kwargs = generator_kwargs
+        self.grid = None
+        self.words_in_grid = []
+        self.stop_event = None
+        self.init_events()
+
+    def get_grid(self):
+        return self.grid
+
+    def get_words_in_grid(self):
+        return self.words_in_grid
+
+    def generate_grid(self):
+        """ Runs the searches and keeps the grid with the highest occupancy.
+        """
+        self.grid = None
+        self.words_in_grid = []
+        self.stop_requested = False
+        self.start_time = time.monotonic()
+        words = len(self.word_list) if self.word_list is not None else len(self.generator_kwargs["word_index"])
+        self.emit("start", dimensions=self.dimensions, words=words, seed=self.seed, jobs=self.n_jobs)
+
+        # Every search has the time a single one would take
+        deadline = time.monotonic() + self.timeout*self.n_loops
+        stop_event = self.stop_event = multiprocessing.Event()
+        generator_args = (self.word_list, self.dimensions, self.n_loops, self.timeout, self.target_occupancy)
+        seeds = [basic_ops.derive_seed(self.seed, job) for job in range(self.n_jobs)]
+
+        with multiprocessing.Pool(self.n_jobs, worker_pool.init_worker, (setup_worker, self.generator_class, generator_args, self.generator_kwargs, deadline, stop_event)) as pool:
+            for seed, grid, words_in_grid, profile in pool.imap_unordered(run_search, seeds):
+                if profile is not None:
+                    self.generator_kwargs["profile"].merge(profile)
+                if self.grid is None or grid.occupancy() > self.grid.occupancy():
+                    self.grid = grid
+                    self.words_in_grid = words_in_grid
+                self.emit("search", seed=seed, search_occupancy=grid.occupancy())
+
+        self.emit("done")
+
+    def stop(self):
+        """ Asks every search to stop as soon as possible.
+        """
+        self.stop_requested = True
+        if self.stop_event is not None:
+            self.stop_event.set()
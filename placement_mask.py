@@ -0,0 +1,84 @@
+from grid import BLOCK_CODE
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def is_available():
+    """ Returns whether NumPy, which the functions of this module need, is installed.
+    """
+    return numpy is not None
+
+
+def grid_array(grid):
+    """ Returns a (lines, columns) array view of the cells of the grid.
+
+    The array shares its memory with the grid, so it always reflects the
+    grid's current contents.
+    """
+    return numpy.frombuffer(grid.cells, dtype=numpy.uint8).reshape(grid.height, grid.width)
+
+
+def placement_mask(cells, word, direction, crossing=False):
+    """ Computes where the given word can be placed, in a single pass over the grid.
+
+    cells is an array of cells (see grid_array), and the returned mask is a
+    boolean array of the same shape, which is True at every cell where the
+    word can start, in the given direction, without going out of bounds,
+    colliding with a letter already in the grid, or touching a letter at
+    either end. These are the same checks as basic_ops.is_valid.
+
+    If crossing is True, the word must also cross at least one letter that is
+    already in the grid, and leave at least one cell to fill.
+    """
+    # Going down is going across the transposed grid
+    if direction == "S":
+        cells = cells.T
+
+    lines, columns = cells.shape
+    length = len(word)
+    mask = numpy.zeros(cells.shape, dtype=bool)
+    anchors = columns - length + 1
+    if anchors <= 0:
+        return mask.T if direction == "S" else mask
+
+    # Ends must be free, and cells out of bounds or blocked are free
+    padded = numpy.zeros((lines, columns+2), dtype=numpy.uint8)
+    padded[:, 1:-1] = cells
+    padded[padded == BLOCK_CODE] = 0
+    valid = (padded[:, :anchors] == 0) & (padded[:, length+1:length+1+anchors] == 0)
+
+    # Every cell must be empty or hold the right letter
+    crossed = numpy.zeros((lines, anchors), dtype=bool)
+    empty = numpy.zeros((lines, anchors), dtype=bool)
+    for k, letter in enumerate(word.encode("latin1")):
+        window = cells[:, k:k+anchors]
+        matches = window == letter
+        is_empty = window == 0
+        valid &= matches | is_empty
+        crossed |= matches
+        empty |= is_empty
+
+    if crossing:
+        valid &= crossed & empty
+
+    mask[:, :anchors] = valid
+    return mask.T if direction == "S" else mask
+
+
+def find_placements(grid, word, crossing=False):
+    """ Lists every place the given word can go in the grid, in both directions.
+
+    Returns a list of possibilities (see basic_ops).
+    """
+    cells = grid_array(grid)
+    placements = []
+
+    for direction in ("E", "S"):
+        lines, columns = numpy.nonzero(placement_mask(cells, word, direction, crossing))
+        for line, column in zip(lines.tolist(), columns.tolist()):
+            placements.append({"word": word, "location": [line, column], "D": direction})
+
+    return placements
@@ -0,0 +1,68 @@
+import json
+import time
+
+
+class Profiler:
+    """ Counts and times the stages of a search.
+
+    The search calls lap() at the end of each stage, which adds the time
+    since the previous lap (or since start()) to that stage, and count() for
+    anything else worth counting, such as the reasons candidates are rejected.
+    Searches take an optional profiler, and skip all of this without one.
+    """
+    def __init__(self):
+        self.counts = {}
+        self.times = {}
+        self.last = time.perf_counter()
+
+    def start(self):
+        """ Starts timing the next stage.
+        """
+        self.last = time.perf_counter()
+
+    def lap(self, stage):
+        """ Ends the current stage, and adds its time to the given one.
+        """
+        now = time.perf_counter()
+        self.times[stage] = self.times.get(stage, 0) + now - self.last
+        self.counts[stage] = self.counts.get(stage, 0) + 1
+        self.last = now
+
+    def count(self, name, n=1):
+        self.counts[name] = self.counts.get(name, 0) + n
+
+    def merge(self, other):
+        """ Adds the counts and times of another profiler to this one.
+        """
+        for name, n in other.counts.items():
+            self.count(name, n)
+        for stage, seconds in other.times.items():
+            self.times[stage] = self.times.get(stage, 0) + seconds
+
+    def to_dict(self):
+        return {"times": dict(self.times), "counts": dict(self.counts)}
+
+    def write_json(self, filename):
+        with open(filename, "w") as json_file:
+            json.dump(self.to_dict(), json_file, indent=1)
+
+    def summary(self):
+        """ Returns a table of the time spent in each stage, and of every other count.
+        """
+        lines = []
+        total = sum(self.times.values())
+
+        lines.append("{:<20} {:>10} {:>8} {:>12} {:>12}".format("Stage", "Time (s)", "Share", "Calls", "Per call"))
+        for stage, seconds in sorted(self.times.items(), key=lambda x: -x[1]):
+            calls = self.counts[stage]
+            lines.append("{:<20} {:>10.3f} {:>7.1f}% {:>12} {:>10.1f}us".format(
+                stage, seconds, 100*seconds/total if total else 0, calls, 1e6*seconds/calls if calls else 0))
+
+        others = {name: n for name, n in self.counts.items() if name not in self.times}
+        if others:
+            lines.append("")
+            lines.append("{:<20} {:>10}".format("Counter", "Count"))
+            for name, n in sorted(others.items()):
+                lines.append("{:<20} {:>10}".format(name, n))
+
+        return "\n".join(lines)
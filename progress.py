@@ -0,0 +1,166 @@
+import queue
+import threading
+import time
+
+import file_ops
+
+
+class EventSource:
+    """ Lets a generator report its progress as a stream of events.
+
+    Events are dictionaries with the kind of "event", the "elapsed" time since
+    the generation started, the "occupancy" of the grid and the number of
+    "tries" so far, along with fields specific to each kind:
+     -> "start": the "dimensions" of the grid, the number of "words" and the "seed";
+     -> "loop": the number of the execution "loop" that starts;
+     -> "word": the "word" (possibility) added, the "new_words" it created and its "score";
+     -> "cull": the "word" (possibility) removed from the grid;
+     -> "stall": no new word was found after "waited" seconds, so the fill gave up;
+     -> "best": the search found a fuller grid than before;
+     -> "search": a search ended, for the given "reason", or a parallel search
+     with the given "seed" finished;
+     -> "done": the generation is over.
+
+    Every subscribed callback is called with each event, in the generating
+    thread. Events are only built if someone is subscribed.
+
+    The generation can be stopped at any point with stop(), which makes the
+    generator wrap up and keep the best grid it found so far.
+    """
+    def init_events(self, stop_condition=None):
+        self.subscribers = []
+        self.stop_condition = stop_condition
+        self.stop_requested = False
+        self.start_time = time.monotonic()
+
+    def subscribe(self, callback):
+        """ Adds a callback, to be called with each event.
+        """
+        self.subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        self.subscribers.remove(callback)
+
+    def emit(self, event_type, **fields):
+        if not self.subscribers:
+            return
+
+        grid = getattr(self, "grid", None)
+        stats = getattr(self, "stats", None)
+        event = {"event": event_type,
+                 "elapsed": time.monotonic() - self.start_time,
+                 "occupancy": grid.occupancy() if grid is not None else 0,
+                 "tries": stats["tries"] if stats is not None else 0}
+        event.update(fields)
+
+        for callback in self.subscribers:
+            callback(event)
+
+    def stop(self):
+        """ Asks the generation to stop as soon as possible.
+
+        The request holds until the next generation starts.
+        """
+        self.stop_requested = True
+
+    def should_stop(self):
+        if self.stop_requested:
+            return True
+        return self.stop_condition is not None and self.stop_condition()
+
+
+class ConsoleReporter:
+    """ Prints the events of a generator to the console.
+    """
+    def __call__(self, event):
+        kind = event["event"]
+
+        if kind == "start":
+            print("Generating {} grid with {} words and seed {}.".format(event["dimensions"], event["words"], event["seed"]))
+        elif kind == "loop":
+            print("Starting execution loop {}:".format(event["loop"]))
+        elif kind == "word":
+            print("Word \"{}\" added. Occupancy: {:2.3f}. Score: {}.".format(event["word"]["word"], event["occupancy"], event["score"]))
+            if event["new_words"]:
+                print("This also created the words:", event["new_words"])
+        elif kind == "stall":
+            print("No new word found in {:.2f}s, moving on.".format(event["waited"]))
+        elif kind == "cull":
+            print("Culling word: {}.".format(event["word"]))
+        elif kind == "best":
+            print("Best grid so far has occupancy {:2.3f}.".format(event["occupancy"]))
+        elif kind == "search":
+            if "seed" in event:
+                print("Search with seed {} built a grid of occupancy {}.".format(event["seed"], event["search_occupancy"]))
+            else:
+                print("Search {} after {} nodes.".format(event["reason"], event["nodes"]))
+        elif kind == "done":
+            print("Built a grid of occupancy {}.".format(event["occupancy"]))
+
+
+class Checkpointer:
+    """ Saves the state of a generator to a file as the generation goes (see
+    GridGenerator.get_state), so that it can be resumed if it is interrupted.
+
+    The state is saved when a word is added (at most once every interval
+    seconds), and whenever a loop starts, a fill stalls or the generation is
+    done.
+    """
+    def __init__(self, generator, filename, interval=1.0):
+        self.generator = generator
+        self.filename = filename
+        self.interval = interval
+        self.last_save = time.monotonic()
+
+    def __call__(self, event):
+        if event["event"] == "word" and time.monotonic() - self.last_save < self.interval:
+            return
+        if event["event"] in ("word", "loop", "stall", "done"):
+            file_ops.write_checkpoint(self.filename, self.generator.get_state())
+            self.last_save = time.monotonic()
+
+
+def iter_events(generator, max_pending=1000):
+    """ Runs a generator in the background, and yields its events as they come.
+
+    Closing the iterator (or leaving a loop over it early) stops the
+    generation, after which the generator holds the best grid it found so
+    far. If the events are not consumed fast enough, the generation waits
+    once max_pending of them are queued.
+    """
+    events = queue.Queue(max_pending)
+    finished = object()
+    stopped = threading.Event()
+
+    def put(event):
+        # Don't block forever on a consumer that went away, and make sure the
+        # generator stops even if it was asked to before it started
+        while not stopped.is_set():
+            try:
+                events.put(event, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+        generator.stop()
+
+    def run():
+        try:
+            generator.generate_grid()
+        finally:
+            put(finished)
+
+    generator.subscribe(put)
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+
+    try:
+        while True:
+            event = events.get()
+            if event is finished:
+                break
+            yield event
+    finally:
+        stopped.set()
+        generator.stop()
+        thread.join()
+        generator.unsubscribe(put)
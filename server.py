@@ -0,0 +1,333 @@
+#!/usr/bin/python3
+""" Crossword Generation Server
+
+This script keeps a word list loaded and serves puzzles over HTTP, on
+localhost, so that puzzles can be generated one after another without
+reading the dictionary and starting Python again for each of them.
+
+Puzzles are built by a pool of worker processes, each of which loads the
+word index once, when it starts. Requests that find the pool busy wait in
+line, and once too many of them are waiting, new ones are turned away with
+a 503 until the line gets shorter.
+
+    POST /generate    Builds a puzzle. The body is a JSON object with any of
+                      "dimensions" ([lines, columns], or a single size),
+                      "occupancy", "deadline" (in seconds, counted from when
+                      the request arrives, including any time spent waiting),
+                      "seed", "algorithm", "loops", "top_k" and "pdf" (true
+                      to also compile the puzzle to a PDF). The reply holds
+                      the grid and its words, as in batch mode's JSONL files.
+    GET /status       Reports the word list size and how busy the server is.
+"""
+
+# Standard imports
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import math
+import os
+import time
+
+# Custom imports
+import file_ops
+import worker_pool
+from crossword_generator import algorithm_class_map, create_generator
+from worker_pool import worker_state
+
+
+# Reason phrases of the statuses the server replies with
+HTTP_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large",
+                500: "Internal Server Error", 503: "Service Unavailable", 504: "Gateway Timeout"}
+
+# Largest request body accepted, in bytes
+MAX_BODY_SIZE = 1 << 16
+
+
+class RequestError(Exception):
+    """ A request that cannot be served, and the HTTP status to reply with.
+    """
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+    def __reduce__(self):
+        # Errors raised in worker processes are sent back to the server
+        return (RequestError, (self.status, str(self)))
+
+
+def parse_cmdline_args():
+    """ Uses argparse to get commands line args.
+    """
+    parser = argparse.ArgumentParser(description='Serve crossword puzzles over HTTP.')
+    parser.add_argument('-f', type=str,
+                        default="words.txt",
+                        dest="word_file",
+                        help="A file containing words, one word per line.")
+    parser.add_argument('--host', type=str,
+                        default="127.0.0.1",
+                        dest="host",
+                        help="Address to listen on.")
+    parser.add_argument('--port', type=int,
+                        default=8080,
+                        dest="port",
+                        help="Port to listen on. 0 picks a free one.")
+    parser.add_argument('-j', '--jobs', type=int,
+                        default=os.cpu_count() or 1,
+                        dest="jobs",
+                        help="Number of puzzles built at the same time, each in its own process.")
+    parser.add_argument('--max-pending', type=int,
+                        default=16,
+                        dest="max_pending",
+                        help="Number of requests that may be in progress or waiting, beyond which new ones are turned away.")
+    parser.add_argument('-t', type=float,
+                        default=10,
+                        dest="deadline",
+                        help="Default deadline of a request, in seconds.")
+    parser.add_argument('--max-deadline', type=float,
+                        default=60,
+                        dest="max_deadline",
+                        help="Longest deadline a request may ask for, in seconds.")
+    parser.add_argument('--pdf-dir', type=str,
+                        default="puzzles",
+                        dest="pdf_dir",
+                        help="Folder where the PDFs that are asked for are written.")
+    parser.add_argument('--latex-compiler', type=str,
+                        default="pdflatex",
+                        dest="latex_compiler",
+                        help="The latex compiler to use. \"stub\" skips compilation and writes the latex source instead, for testing without TeX.")
+
+    return parser.parse_args()
+
+
+def setup_worker(word_file, pdf_dir, compiler):
+    """ Sets up a worker process of the pool (see worker_pool.init_worker).
+
+    The word index is loaded once per worker (memory-mapping the compiled
+    index, which the server compiled at startup), and reused for every
+    puzzle that worker builds. Each generator only keeps a bitmap of the
+    words it used (see WordStore).
+    """
+    return {"word_index": file_ops.load_word_index(word_file),
+            "pdf_dir": pdf_dir,
+            "compiler": compiler}
+
+
+def build_puzzle(number, options, deadline):
+    """ Builds a single puzzle in a worker process, and returns it as a dictionary
+    that can be written as JSON.
+
+    The deadline is a time.monotonic() time, which is shared by every process
+    on the machine, so the puzzle only gets the time that was not spent
+    waiting for a worker.
+    """
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise RequestError(504, "the deadline passed before a worker was free")
+
+    generator = create_generator(options["algorithm"], None, options["dimensions"], options["loops"],
+                                 remaining / options["loops"], options["occupancy"], seed=options["seed"],
+                                 word_index=worker_state["word_index"], top_k=options["top_k"])
+    generator.generate_grid()
+    grid = generator.get_grid()
+    words_in_grid = generator.get_words_in_grid()
+
+    puzzle = file_ops.grid_to_dict(grid, words_in_grid)
+    puzzle.update({"puzzle": number, "seed": generator.seed, "occupancy": grid.occupancy()})
+
+    if options["pdf"]:
+        out_pdf = os.path.join(worker_state["pdf_dir"], "puzzle_{:06d}.pdf".format(number))
+        tex = file_ops.make_latex_document([(grid, [x["word"] for x in words_in_grid])])
+        file_ops.compile_latex(tex, out_pdf, worker_state["compiler"])
+        puzzle["pdf"] = os.path.abspath(out_pdf)
+
+    return puzzle
+
+
+def parse_options(body, default_deadline, max_deadline):
+    """ Checks the options of a generation request, and fills in the missing ones.
+
+    Raises RequestError if any of them is invalid.
+    """
+    try:
+        options = json.loads(body.decode("utf-8")) if body else {}
+    except (UnicodeDecodeError, ValueError):
+        raise RequestError(400, "the body is not valid JSON")
+    if not isinstance(options, dict):
+        raise RequestError(400, "the body must be a JSON object")
+
+    unknown = set(options) - {"dimensions", "occupancy", "deadline", "seed", "algorithm", "loops", "top_k", "pdf"}
+    if unknown:
+        raise RequestError(400, "unknown options: {}".format(", ".join(sorted(unknown))))
+
+    def number(name, default, kind, low, high):
+        value = options.get(name, default)
+        if value is None and default is None:
+            return None
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value) or (kind is int and value != int(value)) or not low <= value <= high:
+            raise RequestError(400, "{} must be a number between {} and {}".format(name, low, high))
+        return kind(value)
+
+    dimensions = options.get("dimensions", [20, 20])
+    if not isinstance(dimensions, list):
+        dimensions = [dimensions]
+    if len(dimensions) == 1:
+        dimensions = dimensions * 2
+    if len(dimensions) != 2 or not all(isinstance(x, int) and not isinstance(x, bool) and 2 <= x <= 1000 for x in dimensions):
+        raise RequestError(400, "dimensions must be one or two sizes between 2 and 1000")
+
+    algorithm = options.get("algorithm", "basic")
+    if algorithm not in algorithm_class_map:
+        raise RequestError(400, "algorithm must be one of: {}".format(", ".join(sorted(algorithm_class_map))))
+
+    return {"dimensions": dimensions,
+            "occupancy": number("occupancy", 1.0, float, 0, 1),
+            "deadline": number("deadline", default_deadline, float, 0, max_deadline),
+            "seed": number("seed", None, int, 0, 2**64-1),
+            "algorithm": algorithm,
+            "loops": number("loops", 1, int, 1, 1000),
+            "top_k": number("top_k", None, int, 1, 10**6),
+            "pdf": bool(options.get("pdf", False))}
+
+
+class GenerationServer:
+    """ Serves puzzles over HTTP, building them in a pool of worker processes.
+
+    At most max_pending requests are in progress or waiting for a worker at
+    any time; any more are turned away at once, so that a burst of requests
+    cannot pile up more work than the pool can get through.
+    """
+    def __init__(self, word_file, jobs, max_pending, deadline, max_deadline, pdf_dir, compiler):
+        # Compile the index once, here, so that the workers only have to map it
+        self.word_index = file_ops.load_word_index(word_file)
+        self.jobs = jobs
+        self.max_pending = max_pending
+        self.deadline = deadline
+        self.max_deadline = max_deadline
+        self.pdf_dir = pdf_dir
+        self.pending = 0
+        self.accepted = 0
+        self.executor = concurrent.futures.ProcessPoolExecutor(jobs, initializer=worker_pool.init_worker, initargs=(setup_worker, word_file, pdf_dir, compiler))
+
+    def close(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+    async def handle_connection(self, reader, writer):
+        """ Reads a single request from a connection, and replies to it.
+        """
+        try:
+            try:
+                method, path, body = await self.read_request(reader)
+                status, reply = 200, await self.route(method, path, body)
+            except RequestError as error:
+                status, reply = error.status, {"error": str(error)}
+            except Exception as error:
+                status, reply = 500, {"error": "{}: {}".format(type(error).__name__, error)}
+            await self.write_response(writer, status, reply)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def read_request(self, reader):
+        """ Returns the method, path and body of an HTTP request.
+        """
+        request_line = (await reader.readline()).decode("latin1").split()
+        if len(request_line) != 3:
+            raise RequestError(400, "malformed request line")
+        method, path, _ = request_line
+
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode("latin1").strip()
+            if not line:
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        try:
+            length = int(headers.get("content-length", 0))
+        except ValueError:
+            raise RequestError(400, "invalid Content-Length")
+        if length > MAX_BODY_SIZE:
+            raise RequestError(413, "the body is too large")
+        body = await reader.readexactly(length) if length > 0 else b""
+
+        return method, path.split("?")[0], body
+
+    async def write_response(self, writer, status, reply):
+        body = (json.dumps(reply) + "\n").encode("utf-8")
+        headers = ["HTTP/1.1 {} {}".format(status, HTTP_REASONS[status]),
+                   "Content-Type: application/json",
+                   "Content-Length: {}".format(len(body)),
+                   "Connection: close"]
+        if status == 503:
+            headers.append("Retry-After: 1")
+        writer.write(("\r\n".join(headers) + "\r\n\r\n").encode("latin1") + body)
+        await writer.drain()
+
+    async def route(self, method, path, body):
+        """ Serves a request, and returns the object to reply with.
+        """
+        if path == "/status":
+            if method != "GET":
+                raise RequestError(405, "use GET for /status")
+            return {"words": len(self.word_index), "jobs": self.jobs, "pending": self.pending, "max_pending": self.max_pending,
+                    "accepted": self.accepted}
+
+        if path == "/generate":
+            if method != "POST":
+                raise RequestError(405, "use POST for /generate")
+            return await self.generate(body)
+
+        raise RequestError(404, "no such endpoint: {}".format(path))
+
+    async def generate(self, body):
+        """ Builds a puzzle in the pool, unless too many are already waiting.
+        """
+        # The deadline starts counting as soon as the request is in
+        start = time.monotonic()
+        options = parse_options(body, self.deadline, self.max_deadline)
+        if self.pending >= self.max_pending:
+            raise RequestError(503, "too many requests in progress, try again later")
+
+        self.pending += 1
+        number = self.accepted
+        self.accepted += 1
+        try:
+            loop = asyncio.get_running_loop()
+            puzzle = await loop.run_in_executor(self.executor, build_puzzle, number, options, start + options["deadline"])
+        finally:
+            self.pending -= 1
+
+        puzzle["elapsed"] = time.monotonic() - start
+        return puzzle
+
+
+async def serve(args):
+    if not os.path.isdir(args.pdf_dir):
+        os.makedirs(args.pdf_dir)
+
+    generation_server = GenerationServer(args.word_file, args.jobs, args.max_pending, args.deadline, args.max_deadline, args.pdf_dir, args.latex_compiler)
+    print("Read {} words from file.".format(len(generation_server.word_index)))
+
+    try:
+        server = await asyncio.start_server(generation_server.handle_connection, args.host, args.port)
+        host, port = server.sockets[0].getsockname()[:2]
+        print("Serving on http://{}:{}/ with {} jobs.".format(host, port, args.jobs), flush=True)
+        async with server:
+            await server.serve_forever()
+    finally:
+        generation_server.close()
+
+
+def main():
+    args = parse_cmdline_args()
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        print("Stopped.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+from grid import BLOCK
+
+
+def split_run(run_length, lengths, max_length, offset=0):
+    """ Splits a run of cells into segments separated by single blocked cells.
+
+    Segments start at even positions of the run, so that every block lands on
+    an odd position. Every segment but the last therefore has an odd length,
+    taken in turn from the given lengths (starting at the given offset). The
+    last segment takes whatever is left of the run.
+
+    Returns a list of (start, length) tuples.
+    """
+    odd_lengths = [length for length in lengths if length % 2 == 1 and 3 <= length <= max_length]
+    segments = []
+    start = 0
+
+    while run_length - start > max_length and odd_lengths:
+        # Find a length that leaves enough room for another word
+        for k in range(len(odd_lengths)):
+            length = odd_lengths[(offset + k) % len(odd_lengths)]
+            if run_length - start - length - 1 >= 3:
+                break
+        else:
+            break
+
+        segments.append((start, length))
+        start += length + 1
+        offset += 1
+
+    segments.append((start, run_length - start))
+    return segments
+
+
+def create_lattice_pattern(dimensions, lengths, max_length=11):
+    """ Creates a pattern of blocked cells for the given dimensions.
+
+    The pattern is a lattice: across words go on even lines and down words on
+    even columns, so that every other letter of each word is checked by a
+    crossing word, and cells on odd lines and odd columns are blocked. Long
+    runs are split so that no word is longer than max_length, and the splits
+    are staggered between lines (and columns) so they don't stack up.
+
+    Returns the set of blocked cells, as (line, column) tuples.
+    """
+    lines, columns = dimensions
+    blocked = set()
+
+    # Cells that belong to neither an across nor a down word
+    for line in range(1, lines, 2):
+        for column in range(1, columns, 2):
+            blocked.add((line, column))
+
+    # Split across runs on even lines
+    for line in range(0, lines, 2):
+        for start, length in split_run(columns, lengths, max_length, line//2)[:-1]:
+            blocked.add((line, start+length))
+
+    # Split down runs on even columns
+    for column in range(0, columns, 2):
+        for start, length in split_run(lines, lengths, max_length, column//2 + 1)[:-1]:
+            blocked.add((start+length, column))
+
+    return blocked
+
+
+def find_blocked_cells(template):
+    """ Returns the set of blocked cells of a template (see Grid.add_template),
+    as (line, column) tuples.
+    """
+    return {(line, column) for line, row in enumerate(template) for column, cell in enumerate(row) if cell == BLOCK}
+
+
+def find_slots(dimensions, blocked):
+    """ Lists every across and down run of at least two open cells.
+
+    Each slot is a dictionary with its "location", direction "D" (as in the
+    possibilities used by basic_ops), "length" and "crossings". Crossings are
+    a list of [position, other_slot, other_position] lists, meaning that the
+    letter at the given position of this slot is the letter at other_position
+    of slot number other_slot.
+    """
+    lines, columns = dimensions
+    slots = []
+
+    # Find every run
+    for direction, outer, inner in (("E", lines, columns), ("S", columns, lines)):
+        for i in range(outer):
+            length = 0
+            for j in range(inner + 1):
+                cell = (i, j) if direction == "E" else (j, i)
+                if j < inner and cell not in blocked:
+                    length += 1
+                    continue
+                if length >= 2:
+                    start = j - length
+                    location = [i, start] if direction == "E" else [start, i]
+                    slots.append({"location": location, "D": direction, "length": length, "crossings": []})
+                length = 0
+
+    # Find where they cross
+    cell_owners = {}
+    for number, slot in enumerate(slots):
+        for position, cell in enumerate(slot_cells(slot)):
+            for other, other_position in cell_owners.get(cell, []):
+                slot["crossings"].append([position, other, other_position])
+                slots[other]["crossings"].append([other_position, number, position])
+            cell_owners.setdefault(cell, []).append((number, position))
+
+    return slots
+
+
+def slot_cells(slot):
+    """ Returns the (line, column) cells covered by a slot.
+    """
+    line, column = slot["location"]
+    if slot["D"] == "E":
+        return [(line, column+k) for k in range(slot["length"])]
+    return [(line+k, column) for k in range(slot["length"])]
@@ -0,0 +1,48 @@
+import random
+import unittest
+
+from csp_generator import CSPGenerator
+
+
+def make_words(n_words, seed=0):
+    """ Returns a list of made-up words, of every length a lattice slot can have.
+    """
+    rng = random.Random(seed)
+    words = set()
+    while len(words) < n_words:
+        length = rng.randint(2, CSPGenerator.max_slot_length)
+        words.add("".join(rng.choice("aeioustrnl") for _ in range(length)))
+    return sorted(words)
+
+
+class CSPGeneratorTest(unittest.TestCase):
+    def check_grid(self, generator, words):
+        grid = generator.get_grid()
+        for word in generator.get_words_in_grid():
+            self.assertIn(word["word"], words)
+            line, column = word["location"]
+            for k, letter in enumerate(word["word"]):
+                if word["D"] == "E":
+                    self.assertEqual(grid.get(line, column+k), letter)
+                else:
+                    self.assertEqual(grid.get(line+k, column), letter)
+
+    def test_small_grid(self):
+        words = make_words(5000)
+        generator = CSPGenerator(words, [15, 15], 1, 30, 1.0, seed=1)
+        generator.generate_grid()
+        self.assertGreater(generator.get_grid().occupancy(), 0.5)
+        self.check_grid(generator, set(words))
+
+    def test_large_grid(self):
+        # A lattice with more slots than Python's recursion limit
+        words = make_words(20000)
+        generator = CSPGenerator(words, [100, 100], 1, 300, 1.0, seed=2)
+        self.assertGreater(len(generator.slots), 1000)
+        generator.generate_grid()
+        self.assertGreater(generator.get_grid().occupancy(), 0.5)
+        self.check_grid(generator, set(words))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+import json
+import unittest
+
+import basic_ops
+from server import RequestError, parse_options
+
+
+def parse(options):
+    return parse_options(json.dumps(options).encode(), 10.0, 60.0)
+
+
+class ParseOptionsTest(unittest.TestCase):
+    def assertBadRequest(self, body):
+        with self.assertRaises(RequestError) as raised:
+            parse_options(body, 10.0, 60.0)
+        self.assertEqual(raised.exception.status, 400)
+
+    def test_defaults(self):
+        options = parse({})
+        self.assertEqual(options["dimensions"], [20, 20])
+        self.assertEqual(options["deadline"], 10.0)
+        self.assertIsNone(options["seed"])
+
+    def test_bad_options(self):
+        self.assertBadRequest(b"not json")
+        self.assertBadRequest(b"[1, 2]")
+        self.assertBadRequest(json.dumps({"colour": "red"}).encode())
+        self.assertBadRequest(json.dumps({"dimensions": [0, 10]}).encode())
+        self.assertBadRequest(json.dumps({"algorithm": "magic"}).encode())
+        self.assertBadRequest(json.dumps({"deadline": 61}).encode())
+        self.assertBadRequest(json.dumps({"seed": -1}).encode())
+        self.assertBadRequest(json.dumps({"loops": 1.5}).encode())
+        self.assertBadRequest(json.dumps({"top_k": True}).encode())
+
+    def test_non_finite_numbers(self):
+        # json.loads accepts these, and int() would fail on them
+        for name in ("seed", "loops", "top_k", "occupancy", "deadline"):
+            for value in (b"Infinity", b"-Infinity", b"NaN"):
+                self.assertBadRequest(b'{"' + name.encode() + b'": ' + value + b"}")
+
+    def test_derived_seeds(self):
+        # Seeds written by batch and parallel runs can be sent back as they are
+        seed = basic_ops.derive_seed(7, 3)
+        self.assertEqual(parse({"seed": seed})["seed"], seed)
+        self.assertEqual(parse({"seed": 2**64-1})["seed"], 2**64-1)
+        self.assertBadRequest(json.dumps({"seed": 2**64}).encode())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,132 @@
+class WordGraph:
+    """ Tracks which words of a grid are connected, as words are added and removed.
+
+    Two words are connected when they share a cell. Each word knows its
+    neighbours and the connected component it belongs to, so isolated words
+    and disconnected parts of the grid are known at any moment, without
+    scanning the grid. Words that cross no other word are kept in a set of
+    their own.
+
+    Words are the possibilities used by basic_ops, and the cells they cover
+    are given by the grid (see Grid.word_cells).
+    """
+    def __init__(self, grid):
+        self.grid = grid
+        self.words = {}
+        self.neighbors = {}
+        self.cell_words = {}
+        self.isolated = set()
+        self.component = {}
+        self.components = {}
+        self.next_component = 0
+
+    def __len__(self):
+        return len(self.words)
+
+    def __contains__(self, possibility):
+        return self.key(possibility) in self.words
+
+    @staticmethod
+    def key(possibility):
+        return possibility["word"], tuple(possibility["location"]), possibility["D"]
+
+    def add(self, possibility):
+        """ Adds a word, connecting it to every word it crosses.
+
+        Components are merged by relabelling the smaller ones into the largest.
+        """
+        key = self.key(possibility)
+        if key in self.words:
+            return
+
+        self.words[key] = possibility
+        self.neighbors[key] = set()
+        for cell in self.grid.word_cells(possibility):
+            for other in self.cell_words.setdefault(cell, set()):
+                self.neighbors[key].add(other)
+                self.neighbors[other].add(key)
+            self.cell_words[cell].add(key)
+
+        if self.neighbors[key]:
+            self.isolated.difference_update(self.neighbors[key])
+        else:
+            self.isolated.add(key)
+
+        # Join the largest neighbouring component, and bring the others into it
+        labels = {self.component[other] for other in self.neighbors[key]}
+        if not labels:
+            label = self.new_component()
+        else:
+            label = max(labels, key=lambda x: len(self.components[x]))
+            for other_label in labels - {label}:
+                for other in self.components.pop(other_label):
+                    self.component[other] = label
+                    self.components[label].add(other)
+
+        self.component[key] = label
+        self.components[label].add(key)
+
+    def remove(self, possibility):
+        """ Removes a word.
+
+        Only the component the word belonged to is looked at again, since it
+        may have been split in several.
+        """
+        key = self.key(possibility)
+        if key not in self.words:
+            return
+
+        for cell in self.grid.word_cells(possibility):
+            self.cell_words[cell].discard(key)
+            if not self.cell_words[cell]:
+                del self.cell_words[cell]
+        for other in self.neighbors.pop(key):
+            self.neighbors[other].discard(key)
+            if not self.neighbors[other]:
+                self.isolated.add(other)
+        self.isolated.discard(key)
+        del self.words[key]
+
+        # Relabel whatever is left of the component
+        label = self.component.pop(key)
+        remaining = self.components.pop(label)
+        remaining.discard(key)
+        while remaining:
+            start = remaining.pop()
+            label = self.new_component()
+            self.component[start] = label
+            self.components[label].add(start)
+            stack = [start]
+            while stack:
+                for other in self.neighbors[stack.pop()]:
+                    if other in remaining:
+                        remaining.discard(other)
+                        self.component[other] = label
+                        self.components[label].add(other)
+                        stack.append(other)
+
+    def new_component(self):
+        label = self.next_component
+        self.next_component += 1
+        self.components[label] = set()
+        return label
+
+    def isolated_words(self):
+        """ Returns the words that do not cross any other word.
+        """
+        return [self.words[key] for key in self.isolated]
+
+    def get_components(self):
+        """ Returns the connected components, as lists of words, largest first.
+        """
+        components = sorted(self.components.values(), key=len, reverse=True)
+        return [[self.words[key] for key in keys] for keys in components]
+
+    def words_outside_largest_component(self):
+        """ Returns every word that is not in the largest connected component.
+        """
+        if not self.components:
+            return []
+        # Ties are broken the same way on every run
+        largest = max(self.components, key=lambda x: (len(self.components[x]), min(self.components[x])))
+        return [self.words[key] for label, keys in self.components.items() if label != largest for key in keys]
@@ -0,0 +1,329 @@
+import array
+import json
+import mmap
+import os
+import random
+import sys
+import tempfile
+import zlib
+
+
+# First bytes of a compiled index file
+INDEX_FILE_MAGIC = b"CWIDX2\n"
+
+
+class MappedWords:
+    """ The words of a compiled index, read straight from its memory-mapped file.
+
+    Words are stored one after the other, in latin1, and found by their
+    offsets (an array with one more entry than there are words). Each word
+    is decoded when it is asked for, so the words are never copied into the
+    memory of the processes that use them.
+    """
+    def __init__(self, mapping, start, offsets):
+        self.mapping = mapping
+        self.start = start
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, word_id):
+        return self.raw(word_id).decode("latin1")
+
+    def __iter__(self):
+        for word_id in range(len(self)):
+            yield self[word_id]
+
+    def raw(self, word_id):
+        """ Returns the latin1 bytes of a word.
+        """
+        if word_id < 0 or word_id >= len(self):
+            raise IndexError("word id out of range")
+        return self.mapping[self.start + self.offsets[word_id]:self.start + self.offsets[word_id+1]]
+
+
+class WordIndex:
+    """ An index over a word list, used to look up the words that fit a given slot.
+
+    Words are grouped by length, and for every length we keep, for each
+    position and letter, the list of words that have that letter in that
+    position. The index is built once and never changes: queries take the
+    WordStore over the index, which says which words are still available.
+
+    An index can be saved to a binary file, and loaded back from it without
+    being rebuilt (see save and load). A loaded index keeps everything in the
+    memory-mapped file, words included, so that every process that loads it
+    shares a single copy.
+    """
+    def __init__(self, words):
+        # Repeated words would only skew sampling
+        unique_words = list(dict.fromkeys(words))
+
+        # Grouping words by length (without reordering words of the same
+        # length) makes the ids of each length a contiguous range
+        self.words = sorted(unique_words, key=len)
+        self.by_length = {}
+        self.by_letter = {}
+        self.filename = None
+        self.ids = None
+        self.table = None
+        self.weights = None
+
+        start = 0
+        for word_id, word in enumerate(self.words):
+            if word_id+1 == len(self.words) or len(self.words[word_id+1]) != len(word):
+                self.by_length[len(word)] = range(start, word_id+1)
+                start = word_id+1
+
+            for position, letter in enumerate(word):
+                self.by_letter.setdefault((len(word), position, letter), []).append(word_id)
+
+        self.lengths = sorted(self.by_length)
+
+    def __len__(self):
+        return len(self.words)
+
+    def __reduce_ex__(self, protocol):
+        # An index loaded from a file is sent to other processes by name, so
+        # that they map the same file instead of receiving a copy
+        if self.filename is not None:
+            return (WordIndex.load, (self.filename,))
+        return super().__reduce_ex__(protocol)
+
+    def find_matches(self, pattern, available):
+        """ Returns all available words that fit the given pattern.
+
+        The pattern is a list with one element per letter of the word, which is
+        either the letter that must be in that position or None if any letter
+        will do. The available words are those of the given WordStore.
+        """
+        used = available.used
+        fixed = [(position, letter) for position, letter in enumerate(pattern) if letter is not None]
+
+        # Without any fixed letters, every word of the right length fits
+        if not fixed:
+            ids = self.by_length.get(len(pattern), [])
+            return [self.words[x] for x in ids if not used[x]]
+
+        # Start from the shortest list of words, and check the remaining letters directly
+        postings = [self.by_letter.get((len(pattern), position, letter), []) for position, letter in fixed]
+        ids = min(postings, key=len)
+
+        matches = []
+        for word_id in ids:
+            if used[word_id]:
+                continue
+            word = self.words[word_id]
+            if all(word[position] == letter for position, letter in fixed):
+                matches.append(word)
+
+        return matches
+
+    def word_id(self, word):
+        """ Returns the id of a word, or None if it is not in the index.
+
+        A loaded index looks words up in the hash table of its file (see
+        save), and any other index in a dictionary, built the first time.
+        """
+        if self.table is None:
+            if self.ids is None:
+                self.ids = {word: word_id for word_id, word in enumerate(self.words)}
+            return self.ids.get(word)
+
+        try:
+            data = word.encode("latin1")
+        except UnicodeEncodeError:
+            return None
+
+        # Open addressing, with linear probing
+        mask = len(self.table) - 1
+        slot = zlib.crc32(data) & mask
+        while True:
+            entry = self.table[slot]
+            if entry == 0:
+                return None
+            if self.words.raw(entry-1) == data:
+                return entry-1
+            slot = (slot+1) & mask
+
+    def word_weights(self):
+        """ Returns the "crossability" of every word, by id: the average
+        frequency of its letters over the whole index, in thousandths, and at
+        least 1 (see word_sampler).
+
+        The weights are worked out the first time, and kept (or read from
+        the file, for a loaded index).
+        """
+        if self.weights is None:
+            counts = {}
+            for word in self.words:
+                for letter in word:
+                    counts[letter] = counts.get(letter, 0) + 1
+            total = max(sum(counts.values()), 1)
+            frequencies = {letter: 1000*count/total for letter, count in counts.items()}
+            self.weights = [1 + int(sum(map(frequencies.__getitem__, word)) / len(word)) for word in self.words]
+        return self.weights
+
+    def random_word(self, length, available, rng=random, max_tries=100):
+        """ Returns a random available word with the given length, or None if none could be found.
+        """
+        ids = self.by_length.get(length)
+        if not ids:
+            return None
+
+        for _ in range(max_tries):
+            word_id = ids[rng.randint(0, len(ids)-1)]
+            if not available.used[word_id]:
+                return self.words[word_id]
+
+        return None
+
+    def save(self, filename, source_hash=""):
+        """ Saves the index to a binary file.
+
+        The file starts with a JSON header, which records the given hash of
+        the source the index was built from, followed by the lists of words
+        for each (length, position, letter) key, as arrays of word ids, by the
+        weight of each word (see word_weights), by a hash table from words to
+        their ids (see word_id), and by the words themselves (in latin1, one
+        after the other, found by their offsets).
+        """
+        keys = array.array("I")
+        postings = array.array("I")
+        for (length, position, letter), ids in sorted(self.by_letter.items()):
+            keys.extend([length, position, ord(letter), len(postings), len(ids)])
+            postings.extend(ids)
+        weights = array.array("I", self.word_weights())
+
+        encoded = [word.encode("latin1") for word in self.words]
+        words = b"".join(encoded)
+        offsets = array.array("I", [0])
+        for data in encoded:
+            offsets.append(offsets[-1] + len(data))
+
+        # The table is at most half full, and holds word id + 1 (0 marks an empty slot)
+        table = array.array("I", [0]) * (1 << (2*len(encoded)).bit_length())
+        mask = len(table) - 1
+        for word_id, data in enumerate(encoded):
+            slot = zlib.crc32(data) & mask
+            while table[slot]:
+                slot = (slot+1) & mask
+            table[slot] = word_id+1
+
+        # Sections are laid out one after the other, aligned for the arrays
+        arrays = {"keys": keys, "postings": postings, "weights": weights, "offsets": offsets, "table": table}
+        sections = {}
+        offset = 0
+        for name, size in [(name, len(data)*data.itemsize) for name, data in arrays.items()] + [("words", len(words))]:
+            sections[name] = [offset, size]
+            offset += size + (-size % keys.itemsize)
+
+        header = json.dumps({"source_hash": source_hash,
+                             "byteorder": sys.byteorder,
+                             "itemsize": keys.itemsize,
+                             "lengths": [[length, ids.start, ids.stop] for length, ids in sorted(self.by_length.items())],
+                             "sections": sections}).encode() + b"\n"
+        padding = b" " * (-(len(INDEX_FILE_MAGIC) + len(header)) % keys.itemsize)
+
+        # The file is replaced at once, so that an interrupted save never
+        # leaves a broken index behind, and processes that have the old one
+        # mapped keep reading it
+        descriptor, temp_filename = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(filename)), prefix=os.path.basename(filename) + ".")
+        try:
+            with os.fdopen(descriptor, "wb") as index_file:
+                index_file.write(INDEX_FILE_MAGIC + header + padding)
+                for data in [data.tobytes() for data in arrays.values()] + [words]:
+                    index_file.write(data)
+                    index_file.write(b"\0" * (-len(data) % keys.itemsize))
+            os.replace(temp_filename, filename)
+        except BaseException:
+            os.remove(temp_filename)
+            raise
+
+    @classmethod
+    def load(cls, filename, source_hash=None):
+        """ Loads an index saved with save.
+
+        The file is memory-mapped, and the words, the lists of word ids, the
+        weights and the hash table are all used straight from the mapping, so
+        loading is fast and processes that load the same file share its memory.
+
+        Returns None if the file does not exist, is not an index (or a
+        truncated or otherwise broken one), was saved on an incompatible
+        machine, or (if a hash is given) was built from a different source.
+        """
+        try:
+            with open(filename, "rb") as index_file:
+                mapping = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+
+        if mapping[:len(INDEX_FILE_MAGIC)] != INDEX_FILE_MAGIC:
+            return None
+
+        header_end = mapping.find(b"\n", len(INDEX_FILE_MAGIC)) + 1
+        try:
+            header = json.loads(mapping[len(INDEX_FILE_MAGIC):header_end])
+            if source_hash is not None and header["source_hash"] != source_hash:
+                return None
+            if header["byteorder"] != sys.byteorder or header["itemsize"] != array.array("I").itemsize:
+                return None
+            index = cls.map_sections(mapping, header_end, header)
+        except (ValueError, KeyError, TypeError, IndexError):
+            return None
+        if index is None:
+            return None
+
+        index.filename = filename
+        return index
+
+    @classmethod
+    def map_sections(cls, mapping, header_end, header):
+        """ Builds an index over the sections of a mapped file, as described by its header.
+
+        Returns None if the sections do not fit in the file, or do not fit together.
+        """
+        itemsize = header["itemsize"]
+
+        # Sections start right after the (padded) header
+        data_start = header_end + (-header_end % itemsize)
+        data = memoryview(mapping)[data_start:]
+        for name in ("keys", "postings", "weights", "offsets", "table", "words"):
+            offset, size = header["sections"][name]
+            if offset < 0 or size < 0 or offset + size > len(data) or (name != "words" and (offset % itemsize or size % itemsize)):
+                return None
+
+        def section(name):
+            offset, size = header["sections"][name]
+            return data[offset:offset+size]
+
+        # Every word has an offset (and the end of the last one), a weight,
+        # and its letters within the words section
+        n_words = max([stop for _, _, stop in header["lengths"]], default=0)
+        offsets = section("offsets").cast("I")
+        table = section("table").cast("I")
+        if len(offsets) != n_words+1 or len(section("weights")) != n_words*itemsize or offsets[-1] > header["sections"]["words"][1]:
+            return None
+        if len(table) == 0 or len(table) & (len(table)-1) or len(section("keys")) % (5*itemsize):
+            return None
+
+        index = cls.__new__(cls)
+        index.filename = None
+        index.words = MappedWords(mapping, data_start + header["sections"]["words"][0], offsets)
+        index.weights = section("weights").cast("I")
+        index.table = table
+        index.ids = None
+        index.by_length = {length: range(start, stop) for length, start, stop in header["lengths"]}
+        index.lengths = sorted(index.by_length)
+
+        keys = section("keys").cast("I")
+        postings = section("postings").cast("I")
+        index.by_letter = {}
+        for k in range(0, len(keys), 5):
+            length, position, letter, offset, count = keys[k:k+5]
+            if offset + count > len(postings):
+                return None
+            index.by_letter[(length, position, chr(letter))] = postings[offset:offset+count]
+
+        return index
@@ -0,0 +1,116 @@
+import array
+import random
+
+
+class WordSampler:
+    """ Draws available words of a given length, favouring words that are easy to cross.
+
+    Each word is weighted by how common its letters are across the whole word
+    list (its "crossability", see WordIndex.word_weights): words made of
+    common letters leave letters that other words are likely to cross, while
+    words full of rare letters tend to leave dead ends. Words are drawn in
+    proportion to their weight, from the words of the requested length only.
+
+    The sampler follows a WordStore (see WordStore.watch): words that are
+    not available get a weight of 0, and get their weight back if they are
+    restored. Weights are kept in one Fenwick tree per length, so drawing a
+    word and updating a weight both take a logarithmic time, whatever the
+    number of words used.
+    """
+    def __init__(self, index, store):
+        self.index = index
+        self.store = store
+
+        # Weights are integers, so that the trees never drift
+        self.base_weights = index.word_weights()
+        self.max_weight = max(self.base_weights, default=1)
+
+        # One tree per length, over the contiguous ids of that length, in a
+        # compact array since every process builds its own
+        self.trees = {}
+        for length, ids in index.by_length.items():
+            tree = [0] + [0 if store.used[word_id] else self.base_weights[word_id] for word_id in ids]
+            for position in range(1, len(tree)):
+                parent = position + (position & -position)
+                if parent < len(tree):
+                    tree[parent] += tree[position]
+            self.trees[length] = array.array("q", tree)
+
+        store.watch(self.set_available)
+
+    def set_available(self, word_id, available):
+        """ Gives a word its weight back, or a weight of 0 if it is no longer available.
+
+        The store only calls this when a word changes, so the weight of the
+        word is always the opposite of what it is asked to be.
+        """
+        delta = self.base_weights[word_id] if available else -self.base_weights[word_id]
+
+        length = len(self.index.words[word_id])
+        tree = self.trees[length]
+        position = word_id - self.index.by_length[length].start + 1
+        while position < len(tree):
+            tree[position] += delta
+            position += position & -position
+
+    def total(self, length):
+        """ Returns the total weight of the available words of the given length.
+        """
+        tree = self.trees.get(length)
+        if tree is None:
+            return 0
+        total = 0
+        position = len(tree) - 1
+        while position > 0:
+            total += tree[position]
+            position -= position & -position
+        return total
+
+    def random_word(self, length, rng=random):
+        """ Returns a random available word of the given length, drawn in
+        proportion to its weight, or None if there is none.
+        """
+        total = self.total(length)
+        if total == 0:
+            return None
+
+        # Walk down the tree to the word where the running weight passes the target
+        tree = self.trees[length]
+        target = rng.randint(0, total-1)
+        position = 0
+        step = 1 << (len(tree) - 1).bit_length()
+        while step:
+            if position + step < len(tree) and tree[position + step] <= target:
+                position += step
+                target -= tree[position]
+            step >>= 1
+
+        return self.index.words[self.index.by_length[length].start + position]
+
+    def random_match(self, pattern, rng=random, max_tries=32):
+        """ Returns a random available word that fits the given pattern (see
+        WordIndex.find_matches), favouring words with a higher weight, or None
+        if none was found in max_tries draws.
+
+        Words are drawn from the shortest list of words that have one of the
+        pattern's letters in the right place, so no list of every match is
+        ever built.
+        """
+        fixed = [(position, letter) for position, letter in enumerate(pattern) if letter is not None]
+        if not fixed:
+            return self.random_word(len(pattern), rng)
+        ids = min((self.index.by_letter.get((len(pattern), position, letter), ()) for position, letter in fixed), key=len)
+        if not ids:
+            return None
+
+        for _ in range(max_tries):
+            word_id = ids[rng.randint(0, len(ids)-1)]
+
+            # Used words weigh nothing, and lighter words are kept less often
+            if self.store.used[word_id] or rng.randint(1, self.max_weight) > self.base_weights[word_id]:
+                continue
+            word = self.index.words[word_id]
+            if all(word[position] == letter for position, letter in fixed):
+                return word
+
+        return None
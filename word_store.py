@@ -0,0 +1,124 @@
+# Values of each word in a store's bitmap
+AVAILABLE = 0
+USED = 1
+LEFT_OUT = 2
+
+
+class WordStore:
+    """ The words of a WordIndex that are still available, with constant-time
+    membership, removal and restoration.
+
+    The store never changes the index, or any list of words: it keeps its own
+    bitmap, with one byte per word of the index, which says whether the word
+    is available, was used, or was left out of the store altogether. The
+    index can therefore be shared by every process that builds grids (see
+    WordIndex.load), each of which only needs a store of its own.
+
+    The ids of the words used since the store was last restored are kept as
+    well, so that restoring it takes no scan of the bitmap.
+
+    Other objects can follow which words are available (see watch).
+    """
+    def __init__(self, index, words=None):
+        """ Every word of the index is available, unless a list of words is
+        given, in which case only those of them that are in the index are.
+        """
+        self.index = index
+        self.removed = set()
+        self.watchers = []
+
+        if words is None:
+            self.used = bytearray(len(index))
+        else:
+            self.used = bytearray([LEFT_OUT]) * len(index)
+            for word in words:
+                word_id = index.word_id(word)
+                if word_id is not None:
+                    self.used[word_id] = AVAILABLE
+
+        self.size = self.used.count(AVAILABLE)
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, word):
+        word_id = self.index.word_id(word)
+        return word_id is not None and self.used[word_id] == AVAILABLE
+
+    def __iter__(self):
+        for word_id, used in enumerate(self.used):
+            if used == AVAILABLE:
+                yield self.index.words[word_id]
+
+    def remove(self, word):
+        """ Removes a word from the available words.
+
+        Raises ValueError if the word is not available, like list.remove.
+        """
+        word_id = self.index.word_id(word)
+        if word_id is None or self.used[word_id] != AVAILABLE:
+            raise ValueError("{} is not in the word store".format(word))
+
+        self.used[word_id] = USED
+        self.removed.add(word_id)
+        self.size -= 1
+        for watcher in self.watchers:
+            watcher(word_id, False)
+
+    def add(self, word):
+        """ Makes a removed word available again.
+
+        Raises ValueError if the word was never in the store.
+        """
+        word_id = self.index.word_id(word)
+        if word_id is None or self.used[word_id] == LEFT_OUT:
+            raise ValueError("{} was never in the word store".format(word))
+        if self.used[word_id] == AVAILABLE:
+            return
+
+        self.used[word_id] = AVAILABLE
+        self.removed.discard(word_id)
+        self.size += 1
+        for watcher in self.watchers:
+            watcher(word_id, True)
+
+    def watch(self, watcher):
+        """ Adds a callback, which is called with the id of a word (in the
+        index) and whether it is available, every time a word is removed or
+        made available again.
+        """
+        self.watchers.append(watcher)
+
+    def get_state(self):
+        """ Returns the state of the store, in a form that can be written as JSON.
+
+        Only the words that were used are recorded, so the state stays small.
+        """
+        return {"used": sorted(self.index.words[word_id] for word_id in self.removed)}
+
+    def set_state(self, state):
+        """ Brings the store back to a state returned by get_state.
+
+        Raises ValueError if the state holds words that are not in the store.
+        """
+        if "used" not in state:
+            raise ValueError("word store state is from an older version")
+
+        self.restore()
+        for word in state["used"]:
+            if word not in self:
+                raise ValueError("word store state does not match its words")
+            self.remove(word)
+
+    def restore(self):
+        """ Makes every removed word available again.
+        """
+        removed = self.removed
+        self.removed = set()
+        for word_id in removed:
+            self.used[word_id] = AVAILABLE
+        self.size += len(removed)
+
+        for watcher in self.watchers:
+            for word_id in removed:
+                watcher(word_id, True)
@@ -0,0 +1,30 @@
+import os
+import sys
+
+from profiler import Profiler
+
+
+# State of the current worker process, set up by init_worker
+worker_state = {}
+
+
+def init_worker(setup, *args):
+    """ Sets up a worker process of a pool (a multiprocessing.Pool or a
+    concurrent.futures.ProcessPoolExecutor).
+
+    Workers keep quiet, since their output would be interleaved with the
+    others'. The given setup function is called with the other arguments,
+    and returns a dictionary, which becomes the worker's state.
+    """
+    sys.stdout = open(os.devnull, "w")
+    worker_state.update(setup(*args))
+
+
+def task_profile(profile):
+    """ Returns a new profiler for a task run in a worker, if profiling is on
+    (i.e. the given profiler is not None), or None.
+
+    Each task is profiled on its own, and its results are sent back and
+    added up by the parent (see Profiler.merge).
+    """
+    return Profiler() if profile is not None else None